@@ -1,28 +1,38 @@
 # coding=utf-8
 import asyncio
-import io
 import logging
-import math
 import os
-import pickle
 import random
-from typing import Dict
-
-from PIL import Image
-from PIL.ImageDraw import ImageDraw
+import re
+from typing import Dict, Tuple
 
 import discord
 from discord.ext.commands import AutoShardedBot, Context, command, group
 
-from pymarkovchain import MarkovChain
-
 import res.snakes.common_snakes
 from res.rattle.rattleconfig import RATTLES
 
-from bot.sneks import perlin
-from bot.sneks.hatching import hatching, hatching_snakes
+from bot.constants import ADMIN_ROLE, DEVOPS_ROLE, OWNER_ROLE
+from bot.decorators import with_role
+from bot.executor import ExecutorBusy
+from bot.sneks.avatars import AVATAR_CACHE_SIZE, AvatarCache
+from bot.sneks.cache import CACHE_FILE, CACHE_MAX_ENTRIES, CACHE_TTL, TaxonCache
+from bot.sneks.corpus import CORPUS_FILE, CORPUS_MAX_USERS, MessageCorpus
+from bot.sneks.drawing import (
+    IMAGE_SIZE, SHEET_MAX_COUNT, SHEET_MAX_SIZE, SHEET_MIN_SIZE, SHEET_SIZE, format_seed, generate_snake_image,
+    generate_snake_sheet, parse_seed, random_seed
+)
+from bot.sneks.fuzzy import FuzzyIndex
+from bot.sneks.hatching import HatchAnimations, hatching_snakes
+from bot.sneks.history import scan_history
+from bot.sneks.markov import MarkovModel, train_model
+from bot.sneks.mirror import ItisMirror, MIRROR_FILE
+from bot.sneks.namefile import NameFile
 from bot.sneks.sal import SnakeAndLaddersGame
-from bot.sneks.sneks import Embeddable, SnakeDef, scrape_itis, snakify
+from bot.sneks.salsim import board_stats, format_stats
+from bot.sneks.sneks import Embeddable, SnakeDef, normalize_name, scrape_itis, snakify
+from bot.sneks.voice import VOICE_IDLE_TIMEOUT, VOICE_QUEUE_SIZE, VoiceQueueFull, VoiceSessions
+from bot.utils import LRUCache, SingleFlight, WarmPool
 
 log = logging.getLogger(__name__)
 
@@ -42,8 +52,31 @@ SNEK_SAD = discord.Embed()
 SNEK_SAD.title = "sad snek :("
 SNEK_SAD.set_image(url="https://momoperes.ca/files/sadsnek.jpeg")
 
+# random snek pool defaults
+RANDOM_POOL_SIZE = 5
+RANDOM_POOL_CONCURRENCY = 2
+RANDOM_POOL_REFILL_DELAY = 1.0  # seconds between two refills, for each refill worker
+
+# snek drawing defaults
+DRAW_CACHE_SIZE = 256  # rendered sneks kept in memory, by seed
+DRAW_POOL_SIZE = 4  # sneks rendered ahead of time
+DRAW_POOL_REFILL_DELAY = 0.5
+
+# snakes and ladders defaults
+SAL_IDLE_TIMEOUT_WAITING = 10 * 60  # seconds without activity before a game that hasn't started is closed
+SAL_IDLE_TIMEOUT_ROLL = 15 * 60  # same, for a game that is being played
+SAL_MAX_GAMES = 100
+SAL_MAX_IMAGE_BYTES = 64 * 1024 * 1024
+SAL_REAP_INTERVAL = 30  # seconds between two checks for abandoned games
+
 # max messages to train on per user
 MSG_MAX = 100
+CORPUS_FLUSH_INTERVAL = 60  # seconds between two saves of the message corpus
+BACKFILL_LIMIT = 1000  # messages read from each channel, the first time a user is snakified
+BACKFILL_CONCURRENCY = 4  # history API calls at the same time
+BACKFILL_PAGES = 20  # history API calls per backfill, across all channels
+BACKFILL_TIMEOUT = 10  # seconds
+MARKOV_CACHE_SIZE = 256  # trained snakeme models kept in memory, by user
 
 
 class Snakes:
@@ -65,18 +98,131 @@ class Snakes:
         if self.ffmpeg_executable is None:
             self.ffmpeg_executable = 'ffmpeg'
 
-        # snakes and ladders
-        self.active_sal: Dict[discord.TextChannel, SnakeAndLaddersGame] = {}
+        # voice connections, kept open between rattles
+        self.voice = VoiceSessions(
+            self.bot.loop,
+            idle_timeout=float(os.environ.get('VOICE_IDLE_TIMEOUT', VOICE_IDLE_TIMEOUT)),
+            queue_size=int(os.environ.get('VOICE_QUEUE_SIZE', VOICE_QUEUE_SIZE))
+        )
+
+        # taxon cache
+        self.taxon_cache = TaxonCache(
+            path=os.environ.get('SNEK_CACHE_FILE', CACHE_FILE),
+            ttl=float(os.environ.get('SNEK_CACHE_TTL', CACHE_TTL)),
+            max_entries=int(os.environ.get('SNEK_CACHE_MAX_ENTRIES', CACHE_MAX_ENTRIES))
+        )
+        # local ITIS mirror (optional)
+        mirror_file_path = os.environ.get('ITIS_MIRROR_FILE', MIRROR_FILE)
+        if not os.path.isfile(mirror_file_path):
+            log.info("No ITIS mirror could be found at \'{0}\', sneks will be searched online".format(
+                mirror_file_path))
+            self.itis_mirror = None
+        else:
+            self.itis_mirror = ItisMirror(mirror_file_path)
+
+        # identical lookups running at the same time share a single scrape
+        self.lookups = SingleFlight()
 
-        # check if the snake list pickle-file exists
-        pickle_file_path = 'sneks.pickle'
-        if not os.path.isfile(pickle_file_path):
-            log.warning("No \'sneks.pickle\' file could be found, random snakes are disabled!")
+        # snakes and ladders, and the board sprites of their players (shared by all the games)
+        self.active_sal: Dict[discord.TextChannel, SnakeAndLaddersGame] = {}
+        self.avatars = AvatarCache(
+            self.bot.http_session, self.bot.executor,
+            max_size=int(os.environ.get('SAL_AVATAR_CACHE_SIZE', AVATAR_CACHE_SIZE))
+        )
+        # abandoned games are closed in the background, by state
+        self.sal_idle_timeouts = {
+            'waiting': float(os.environ.get('SAL_IDLE_TIMEOUT_WAITING', SAL_IDLE_TIMEOUT_WAITING)),
+            'roll': float(os.environ.get('SAL_IDLE_TIMEOUT_ROLL', SAL_IDLE_TIMEOUT_ROLL))
+        }
+        # a game still opening is stuck (e.g. on the author's avatar), and isn't waiting for anyone yet
+        self.sal_idle_timeouts['booting'] = self.sal_idle_timeouts['waiting']
+        self.sal_max_games = int(os.environ.get('SAL_MAX_GAMES', SAL_MAX_GAMES))
+        self.sal_max_image_bytes = int(os.environ.get('SAL_MAX_IMAGE_BYTES', SAL_MAX_IMAGE_BYTES))
+        self.sal_evictions = 0
+        self.sal_board_stats: str = None  # simulated on first use, the board doesn't change
+        self.sal_reaper = self.bot.loop.create_task(self._reap_sal())
+
+        # check if the snake list file exists
+        names_file_path = os.environ.get('SNEK_NAMES_FILE', 'sneks.names')
+        if not os.path.isfile(names_file_path):
+            log.warning("No \'{0}\' file could be found, random snakes are disabled!".format(names_file_path))
             self.snake_list = []
         else:
-            # load pickle
-            with open(pickle_file_path, 'rb') as data:
-                self.snake_list = pickle.load(data)
+            # memory-mapped, names are only read when they are used
+            self.snake_list = NameFile(names_file_path)
+
+        # typo-tolerant index of every snek name we know about
+        self.snake_names = FuzzyIndex()
+        for name in self.snake_list:
+            # drop Wikipedia disambiguations, e.g. "Bothrops (genus)"
+            self.snake_names.add(re.sub(r"\s*\(.*\)$", "", name))
+        # the language, so its typos resolve to it too
+        self.snake_names.add("python")
+        for common_name, rewrite in res.snakes.common_snakes.REWRITES.items():
+            self.snake_names.add(common_name)
+            self.snake_names.add(rewrite)
+        for snek in self.taxon_cache.sneks():
+            # what the sneks are called, rather than how they were searched
+            for name in snek.names():
+                self.snake_names.add(name)
+        if self.itis_mirror is not None:
+            for name in self.itis_mirror.names():
+                self.snake_names.add(name)
+        log.debug("Indexed {0} snek names".format(len(self.snake_names)))
+
+        # random sneks, resolved ahead of time
+        self.random_sneks = WarmPool(
+            self._random_snek,
+            size=int(os.environ.get('SNEK_POOL_SIZE', RANDOM_POOL_SIZE)) if len(self.snake_list) > 0 else 0,
+            concurrency=int(os.environ.get('SNEK_POOL_CONCURRENCY', RANDOM_POOL_CONCURRENCY)),
+            refill_delay=float(os.environ.get('SNEK_POOL_REFILL_DELAY', RANDOM_POOL_REFILL_DELAY))
+        )
+        self.random_sneks.start(self.bot.loop)
+
+        # drawn sneks, by (seed, size), and random sneks drawn ahead of time
+        self.drawn_sneks = LRUCache(int(os.environ.get('DRAW_CACHE_SIZE', DRAW_CACHE_SIZE)))
+        self.drawing_pool = WarmPool(
+            self._prerender_snek,
+            size=int(os.environ.get('DRAW_POOL_SIZE', DRAW_POOL_SIZE)),
+            refill_delay=float(os.environ.get('DRAW_POOL_REFILL_DELAY', DRAW_POOL_REFILL_DELAY))
+        )
+        self.drawing_pool.start(self.bot.loop)
+
+        # recent messages of every user, for snakeme
+        self.corpus = MessageCorpus(
+            path=os.environ.get('SNEKME_CORPUS_FILE', CORPUS_FILE),
+            max_messages=MSG_MAX,
+            max_users=int(os.environ.get('SNEKME_CORPUS_MAX_USERS', CORPUS_MAX_USERS))
+        )
+        self.backfill_limit = int(os.environ.get('SNEKME_BACKFILL_LIMIT', BACKFILL_LIMIT))
+        self.backfill_pages = int(os.environ.get('SNEKME_BACKFILL_PAGES', BACKFILL_PAGES))
+        self.backfill_timeout = float(os.environ.get('SNEKME_BACKFILL_TIMEOUT', BACKFILL_TIMEOUT))
+        self.backfills = SingleFlight()
+        self.backfill_count = 0
+        self.backfill_pages_used = 0
+        self.corpus_flusher = self.bot.loop.create_task(self._flush_corpus())
+        # trained models, by (guild id, user id): ((generation, added) of the corpus they were trained on, model)
+        self.markov_models = LRUCache(int(os.environ.get('SNEKME_MODEL_CACHE_SIZE', MARKOV_CACHE_SIZE)))
+
+        # hatching animations, rendered at startup
+        self.hatch_animations = HatchAnimations(self.bot.http_session, self.bot.executor)
+        self.hatch_prerender = self.bot.loop.create_task(self.hatch_animations.prerender())
+
+    def __unload(self):
+        self.hatch_prerender.cancel()
+        self.voice.close()
+        self.corpus_flusher.cancel()
+        self.corpus.close()
+        self.sal_reaper.cancel()
+        for game in self.active_sal.values():
+            game.task.cancel()
+        self.random_sneks.stop()
+        self.drawing_pool.stop()
+        self.taxon_cache.close()
+        if self.itis_mirror is not None:
+            self.itis_mirror.close()
+        if isinstance(self.snake_list, NameFile):
+            self.snake_list.close()
 
     async def get_snek(self, name: str = None) -> Embeddable:
         """
@@ -84,21 +230,71 @@ class Snakes:
         :param name: the name of the snek
         :return: snek
         """
-        if name is not None and name.lower() == "python":
-            # return info about language
-            return SNEK_PYTHON
-
         if name is None:
-            # check if the pickle file is there
+            # check if the snake list file is there
             if len(self.snake_list) is 0:
                 return None
-            # random snake
-            name = random.choice(self.snake_list).lower()
+            # random snake, ready-made if possible
+            snek = self.random_sneks.take()
+            if snek is None:
+                snek = await self._random_snek()
+            return snek
+
+        if normalize_name(name) == "python":
+            # return info about language
+            return SNEK_PYTHON
+        return await self._lookup_snek(name)
 
-        if name is not None:
-            if name.lower() in res.snakes.common_snakes.REWRITES:
-                name = res.snakes.common_snakes.REWRITES[name.lower()]
-            return await scrape_itis(name.lower())
+    async def find_snek(self, name: str = None) -> Tuple[Embeddable, str]:
+        """
+        Gets information about a snek, or about the snek it is most likely a typo of if it can't be found
+        :param name: the name of the snek
+        :return: (snek, the corrected name or None if it wasn't corrected)
+        """
+        snek = await self.get_snek(name)
+        if snek is not None or name is None:
+            return snek, None
+        # a real snek can be one letter away from another one: names are only corrected once they are unknown
+        corrected = self.snake_names.resolve(name)
+        if corrected is None or corrected == normalize_name(name):
+            return None, None
+        snek = await self.get_snek(corrected)
+        return snek, corrected if snek is not None else None
+
+    async def _random_snek(self) -> Embeddable:
+        """
+        Looks up a random snek from the snake list
+        :return: snek
+        """
+        return await self._lookup_snek(random.choice(self.snake_list).lower())
+
+    async def _lookup_snek(self, name: str) -> Embeddable:
+        """
+        Looks up a snek in the cache, or scrapes it if needed
+        :param name: the name of the snek
+        :return: snek
+        """
+        name = normalize_name(name)
+        if name in res.snakes.common_snakes.REWRITES:
+            name = res.snakes.common_snakes.REWRITES[name]
+        snek = self.taxon_cache.get(name)
+        if snek is None:
+            snek = await self.lookups.do(name, lambda: self._scrape_snek(name))
+        return snek
+
+    async def _scrape_snek(self, name: str) -> Embeddable:
+        """
+        Scrapes a snek from the network and caches it
+        :param name: the normalized name of the snek
+        :return: snek
+        """
+        snek = await scrape_itis(self.bot.http_session, name, mirror=self.itis_mirror)
+        if snek is not None:
+            self.taxon_cache.put(name, snek)
+            # not the query, which may be a typo (e.g. matched loosely by the Wikipedia fallback)
+            for canonical_name in snek.names():
+                self.snake_names.add(canonical_name)
+        return snek
 
     @command(name="snakes.get()", aliases=["snakes.get"])
     async def get(self, ctx: Context, name: str = None):
@@ -107,23 +303,131 @@ class Snakes:
         """
         # fetch data for a snek
         await ctx.send("Fetching data for " + name + "..." if name is not None else "Finding a random snek!")
-        data = await self.get_snek(name)
+        data, corrected = await self.find_snek(name)
         if data is None:
-            await ctx.send("sssorry I can't find that snek :(", embed=SNEK_SAD)
+            suggestions = self.snake_names.suggest(name) if name is not None else []
+            message = "sssorry I can't find that snek :("
+            if len(suggestions) > 0:
+                message += " Did you mean: " + ", ".join("**" + s + "**" for s in suggestions) + "?"
+            await ctx.send(message, embed=SNEK_SAD)
             return
         channel: discord.TextChannel = ctx.channel
         embed = data.as_embed()
         log.debug("Sending embed: " + str(data.__dict__))
-        await channel.send(embed=embed)
+        await channel.send("Showing results for **" + corrected + "**" if corrected is not None else None, embed=embed)
+
+    @command(name="snakes.stats()", aliases=["snakes.stats"])
+    @with_role(OWNER_ROLE, ADMIN_ROLE, DEVOPS_ROLE)
+    async def stats(self, ctx: Context):
+        """
+        Show snek internals (staff only)
+        """
+        lines = [
+            "Taxon cache: {0} entries, {1} hits, {2} misses".format(
+                len(self.taxon_cache), self.taxon_cache.hits, self.taxon_cache.misses),
+            "Lookups: {0} calls, {1} coalesced, {2} in flight".format(
+                self.lookups.calls, self.lookups.coalesced, len(self.lookups.in_flight)),
+            "Random pool: {0}/{1} ready, {2} hits, {3} misses, {4} refills ({5:.2f}s avg), {6} failed".format(
+                len(self.random_sneks), self.random_sneks.size, self.random_sneks.hits, self.random_sneks.misses,
+                self.random_sneks.refills, self.random_sneks.average_refill_time, self.random_sneks.failures),
+            "Drawings: {0} cached, {1} hits, {2} misses; pool {3}/{4} ready, {5} hits, {6} misses".format(
+                len(self.drawn_sneks), self.drawn_sneks.hits, self.drawn_sneks.misses, len(self.drawing_pool),
+                self.drawing_pool.size, self.drawing_pool.hits, self.drawing_pool.misses),
+            "S&L avatars: {0} cached, {1} hits, {2} misses, {3} downloads, {4} coalesced".format(
+                len(self.avatars), self.avatars.sprites.hits, self.avatars.sprites.misses, self.avatars.downloads,
+                self.avatars.fetches.coalesced),
+            "S&L games: {0} active ({1} waiting, {2} playing), {3:.1f} KiB of images, {4} evicted".format(
+                len(self.active_sal), sum(game.state == 'waiting' for game in self.active_sal.values()),
+                sum(game.state == 'roll' for game in self.active_sal.values()),
+                sum(game.image_bytes for game in self.active_sal.values()) / 1024, self.sal_evictions),
+            "Snakeme: {0} backfills, {1} history pages ({2:.1f} per backfill)".format(
+                self.backfill_count, self.backfill_pages_used, self.backfill_pages_used / max(self.backfill_count, 1))
+            + "; models {0} cached, {1} hits, {2} misses".format(
+                len(self.markov_models), self.markov_models.hits, self.markov_models.misses),
+            "Hatching: {0}/{1} animations rendered, {2:.1f} KiB".format(
+                len(self.hatch_animations), len(hatching_snakes), self.hatch_animations.size_bytes / 1024),
+            "Voice: {0} connected, {1} queued, {2} connects, {3} rattles played, {4} failed".format(
+                len(self.voice), self.voice.queued, self.voice.connects, self.voice.played, self.voice.failures),
+            "Executor: " + self.bot.executor.stats()
+        ]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
 
     @command(name="snakes.draw()", aliases=["snakes.draw"])
-    async def draw(self, ctx: Context):
+    async def draw(self, ctx: Context, seed: str = None, size: int = None):
         """
-        Draws a random snek using Perlin noise
+        Draws a random snek using Perlin noise, the snek with the given seed (e.g. snakes.draw('#1a2b3c4d')), or a
+        sheet of sneks (e.g. snakes.draw(16, 512) for 16 sneks in a 512x512 image)
         """
-        stream = self.generate_snake_image()
-        file = discord.File(stream, filename='snek.png')
-        await ctx.send(file=file)
+        if seed is not None and seed.isdigit():
+            await self._draw_sheet(ctx, int(seed), size if size is not None else SHEET_SIZE)
+            return
+        if size is not None:
+            # single sneks are drawn at a fixed scale, only sheets have a size
+            await ctx.send(ctx.author.mention + " Only sheets of sneks can be resized, e.g. `snakes.draw(16, 512)`.")
+            return
+        if seed is None:
+            # random snek, drawn ahead of time if possible
+            prerendered = self.drawing_pool.take()
+            if prerendered is not None:
+                seed, image = prerendered
+                self.drawn_sneks.put((seed, IMAGE_SIZE), image)
+            else:
+                seed = random_seed()
+        else:
+            try:
+                seed = parse_seed(seed)
+            except ValueError:
+                await ctx.send(ctx.author.mention + " That's not a snek seed! Seeds look like `#1a2b3c4d`.")
+                return
+        try:
+            image = await self._draw_snek(seed)
+        except ExecutorBusy:
+            await ctx.send(ctx.author.mention + " I'm drawing too many sneks right now, try again in a bit!")
+            return
+        file = discord.File(image, filename='snek.png')
+        await ctx.send("Snek `{0}`".format(format_seed(seed)), file=file)
+
+    async def _draw_sheet(self, ctx: Context, count: int, size: int):
+        """
+        Draws a sheet of random sneks in a single image
+        :param ctx: the context of the command
+        :param count: the amount of sneks, clamped to SHEET_MAX_COUNT
+        :param size: the width/height of the image, clamped between SHEET_MIN_SIZE and SHEET_MAX_SIZE
+        """
+        count = min(max(count, 1), SHEET_MAX_COUNT)
+        size = min(max(size, SHEET_MIN_SIZE), SHEET_MAX_SIZE)
+        seed = random_seed()
+        try:
+            image = await self.bot.executor.run(generate_snake_sheet, seed, count, size)
+        except ExecutorBusy:
+            await ctx.send(ctx.author.mention + " I'm drawing too many sneks right now, try again in a bit!")
+            return
+        file = discord.File(image, filename='sneks.png')
+        await ctx.send("{0} sneks `{1}`".format(count, format_seed(seed)), file=file)
+
+    async def _draw_snek(self, seed: int) -> bytes:
+        """
+        Draws a snek, or gets it from the cache if it was drawn recently
+        :param seed: the seed of the snek
+        :return: the binary data of the PNG image
+        """
+        key = (seed, IMAGE_SIZE)
+        image = self.drawn_sneks.get(key)
+        if image is None:
+            image = await self.bot.executor.run(generate_snake_image, seed, IMAGE_SIZE)
+            self.drawn_sneks.put(key, image)
+        return image
+
+    async def _prerender_snek(self):
+        """
+        Draws a random snek for the drawing pool
+        :return: (seed, PNG data), or None if the executor is busy
+        """
+        seed = random_seed()
+        try:
+            return seed, await self.bot.executor.run(generate_snake_image, seed, IMAGE_SIZE)
+        except ExecutorBusy:
+            return None
 
     @command(name="snakes.rattle()", aliases=["snakes.rattle"])
     async def rattle(self, ctx: Context):
@@ -134,25 +438,136 @@ class Snakes:
         if author.voice is None or author.voice.channel is None:
             await ctx.send(author.mention + " You are not in a voice channel!")
             return
+        # select random rattle
+        rattle = os.path.join('res', 'rattle', random.choice(RATTLES))
         try:
-            voice_channel = author.voice.channel
-            voice_client: discord.VoiceClient = await voice_channel.connect()
-            # select random rattle
-            rattle = os.path.join('res', 'rattle', random.choice(RATTLES))
-            source = discord.FFmpegPCMAudio(
+            # played once the rattles already queued in the guild are done, on the same connection
+            self.voice.play(author.voice.channel, lambda: discord.FFmpegPCMAudio(
                 rattle,
                 executable=self.ffmpeg_executable
-            )
-            # plays the sound, then dispatches the end_voice event to close the voice client
-            voice_client.play(source, after=lambda x: self.bot.dispatch("end_voice", voice_client))
+            ))
+        except VoiceQueueFull:
+            await ctx.send(author.mention + " Too many rattles already, let the sneks catch their breath!")
+
+    async def on_message(self, message: discord.Message):
+        # feeds the snakeme corpus
+        if message.guild is not None and await self._is_corpus_message(message):
+            self.corpus.add(message.guild.id, message.author.id, message.id, message.content)
+
+    async def _is_corpus_message(self, message: discord.Message) -> bool:
+        """
+        :param message: a message
+        :return: whether the message should be in the snakeme corpus: what people say rather than the commands
+        they use
+        """
+        if message.author.bot or len(message.content) == 0:
+            return False
+        return not (await self.bot.get_context(message)).valid
 
-        except discord.ClientException as e:
-            log.error(e)
+    async def _flush_corpus(self):
+        """
+        Periodically saves the snakeme corpus
+        """
+        while True:
+            await asyncio.sleep(CORPUS_FLUSH_INTERVAL)
+            try:
+                self.corpus.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Could not save the message corpus")
+
+    async def _backfill_corpus(self, guild: discord.Guild, user: discord.Member):
+        """
+        Adds the older messages of a user to the corpus, from the history of the guild (only once per user)
+        :param guild: the guild
+        :param user: the user
+        """
+        if self.backfill_limit <= 0 or self.corpus.is_backfilled(guild.id, user.id):
             return
 
-    # event handler for voice client termination
-    async def on_end_voice(self, voice_client):
-        await voice_client.disconnect()
+        async def predicate(message: discord.Message) -> bool:
+            return message.author.id == user.id and await self._is_corpus_message(message)
+
+        # the messages the corpus already has were sent after the first one it got
+        first_id = self.corpus.first_id(guild.id, user.id)
+        scan = await scan_history(
+            guild.text_channels,
+            predicate,
+            wanted=MSG_MAX,
+            concurrency=BACKFILL_CONCURRENCY,
+            channel_limit=self.backfill_limit,
+            page_budget=self.backfill_pages,
+            time_budget=self.backfill_timeout,
+            before=discord.Object(id=first_id) if first_id is not None else None
+        )
+        self.backfill_count += 1
+        self.backfill_pages_used += scan.pages
+        self.corpus.backfill(guild.id, user.id, [message.content for message in scan.messages])
+        log.info("Backfilled {0} messages of {1} from {2} history pages in {3:.1f}s{4}".format(
+            len(scan.messages), user, scan.pages, scan.elapsed, "" if scan.complete else " (budget ran out)"))
+
+    async def _markov_model(self, guild_id: int, user_id: int) -> MarkovModel:
+        """
+        Gets the Markov model of a user, trained on their messages in the corpus. Cached models are only trained on
+        the messages added since they were last used, and are retrained once they have seen twice MSG_MAX messages.
+        :param guild_id: the id of the guild
+        :param user_id: the id of the user
+        :return: the model
+        """
+        key = (guild_id, user_id)
+        revision = self.corpus.revision(guild_id, user_id)
+        messages = self.corpus.messages(guild_id, user_id)
+        cached = self.markov_models.get(key)
+        if cached is not None:
+            (generation, added), model = cached
+            new = revision[1] - added
+            if generation == revision[0] and new <= len(messages) and model.texts + new <= 2 * MSG_MAX:
+                for text in messages[len(messages) - new:]:
+                    model.add_text(text)
+                self.markov_models.put(key, (revision, model))
+                return model
+        model = await self.bot.executor.run(train_model, messages)
+        self.markov_models.put(key, (revision, model))
+        return model
+
+    async def _reap_sal(self):
+        """
+        Periodically closes the abandoned Snakes and Ladders games
+        """
+        while True:
+            await asyncio.sleep(SAL_REAP_INTERVAL)
+            try:
+                self._enforce_sal_limits()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Could not close the abandoned S&L games")
+
+    def _enforce_sal_limits(self, reserve: int = 0):
+        """
+        Closes the Snakes and Ladders games that have been idle for too long, then the most idle games while there
+        are too many games or their images take too much memory
+        :param reserve: how many games are about to be created
+        """
+        for game in list(self.active_sal.values()):
+            timeout = self.sal_idle_timeouts.get(game.state)
+            if timeout is not None and game.idle_time > timeout:
+                self._evict_sal(game, "since nobody played for a while")
+
+        games = sorted(self.active_sal.values(), key=lambda game: game.last_activity)
+        image_bytes = sum(game.image_bytes for game in games)
+        while len(games) > 0 and (len(games) + reserve > self.sal_max_games
+                                  or image_bytes > self.sal_max_image_bytes):
+            game = games.pop(0)
+            image_bytes -= game.image_bytes
+            self._evict_sal(game, "to make room for other games")
+
+    def _evict_sal(self, game: SnakeAndLaddersGame, reason: str):
+        log.info("Closing the S&L game in #{0} ({1:.0f}s idle, state {2}) {3}".format(
+            game.channel, game.idle_time, game.state, reason))
+        self.sal_evictions += 1
+        game.evict(reason)
 
     @group()
     async def sal(self, ctx: Context):
@@ -165,6 +580,7 @@ class Snakes:
         - Cancel a S&L game (author): sal cancel
         - Start a S&L game (author): sal start
         - Roll the dice: sal roll OR roll
+        - Board statistics: sal stats
         """
         if ctx.invoked_subcommand is None:
             # alias for 'sal roll' -> roll()
@@ -183,9 +599,10 @@ class Snakes:
         if channel in self.active_sal:
             await ctx.send(ctx.author.mention + " A game is already in progress in this channel.")
             return
+        self._enforce_sal_limits(reserve=1)
         game = SnakeAndLaddersGame(snakes=self, channel=channel, author=ctx.author)
         self.active_sal[channel] = game
-        await game.open_game()
+        game.submit(game.open_game)
 
     @sal.command(name="join()", aliases=["join"])
     async def join_sal(self, ctx: Context):
@@ -197,7 +614,7 @@ class Snakes:
             await ctx.send(ctx.author.mention + " There is no active Snakes & Ladders game in this channel.")
             return
         game = self.active_sal[channel]
-        await game.player_join(ctx.author)
+        game.submit(game.player_join, ctx.author)
 
     @sal.command(name="leave()", aliases=["leave", "quit"])
     async def leave_sal(self, ctx: Context):
@@ -209,7 +626,7 @@ class Snakes:
             await ctx.send(ctx.author.mention + " There is no active Snakes & Ladders game in this channel.")
             return
         game = self.active_sal[channel]
-        await game.player_leave(ctx.author)
+        game.submit(game.player_leave, ctx.author)
 
     @sal.command(name="cancel()", aliases=["cancel"])
     async def cancel_sal(self, ctx: Context):
@@ -221,7 +638,7 @@ class Snakes:
             await ctx.send(ctx.author.mention + " There is no active Snakes & Ladders game in this channel.")
             return
         game = self.active_sal[channel]
-        await game.cancel_game(ctx.author)
+        game.submit(game.cancel_game, ctx.author)
 
     @sal.command(name="start()", aliases=["start"])
     async def start_sal(self, ctx: Context):
@@ -233,7 +650,21 @@ class Snakes:
             await ctx.send(ctx.author.mention + " There is no active Snakes & Ladders game in this channel.")
             return
         game = self.active_sal[channel]
-        await game.start_game(ctx.author)
+        game.submit(game.start_game, ctx.author)
+
+    @sal.command(name="stats()", aliases=["stats"])
+    async def stats_sal(self, ctx: Context):
+        """
+        Show how games go on the Snakes and Ladders board, from simulated games.
+        """
+        if self.sal_board_stats is None:
+            try:
+                stats = await self.bot.executor.run(board_stats)
+            except ExecutorBusy:
+                await ctx.send(ctx.author.mention + " I'm too busy to play that many games right now, try again later!")
+                return
+            self.sal_board_stats = format_stats(stats)
+        await ctx.send("```\n" + self.sal_board_stats + "\n```")
 
     @command(name="roll()", aliases=["sal roll", "roll"])
     async def roll_sal(self, ctx: Context):
@@ -245,7 +676,7 @@ class Snakes:
             await ctx.send(ctx.author.mention + " There is no active Snakes & Ladders game in this channel.")
             return
         game = self.active_sal[channel]
-        await game.player_roll(ctx.author)
+        game.submit(game.player_roll, ctx.author)
 
     @command(name="snakes.snakeme()", aliases=["snakes.snakeme", "snakeme"])
     async def snakeme(self, ctx: Context):
@@ -258,16 +689,15 @@ class Snakes:
         author = ctx.message.author if (len(mentions) == 0) else ctx.message.mentions[0]
         channel: discord.TextChannel = ctx.channel
 
-        channels = [channel for channel in ctx.message.guild.channels if isinstance(channel, discord.TextChannel)]
-        channels_messages = [await channel.history(limit=10000).flatten() for channel in channels]
-        msgs = [msg for channel_messages in channels_messages for msg in channel_messages][:MSG_MAX]
-
-        my_msgs = list(filter(lambda msg: msg.author.id == author.id, msgs))
-        my_msgs_content = "\n".join(list(map(lambda x: x.content, my_msgs)))
-
-        mc = MarkovChain()
-        mc.generateDatabase(my_msgs_content)
-        sentence = mc.generateString()
+        guild: discord.Guild = ctx.message.guild
+        # the history is only read the first time someone is snakified, after that the corpus is fed as they talk
+        await self.backfills.do((guild.id, author.id), lambda: self._backfill_corpus(guild, author))
+        try:
+            model = await self._markov_model(guild.id, author.id)
+        except ExecutorBusy:
+            await channel.send(ctx.author.mention + " I'm too busy thinking like a snek right now, try again in a bit!")
+            return
+        sentence = model.generate()
 
         snakeme = discord.Embed()
         snakeme.set_author(name="{0}#{1}".format(author.name, author.discriminator),
@@ -289,85 +719,15 @@ class Snakes:
         channel: discord.TextChannel = ctx.channel
 
         my_snake = list(hatching_snakes.keys())[random.randint(0, 3)]
-        my_snake_img = hatching_snakes[my_snake]
-        log.debug(my_snake_img)
-
-        m = await channel.send(embed=discord.Embed(description="Hatching your snake :snake:..."))
-        await asyncio.sleep(1)
-
-        for i in range(len(hatching)):
-            hatch_embed = discord.Embed(description=hatching[i])
-            await m.edit(embed=hatch_embed)
-            await asyncio.sleep(1)
-        # await m.edit(embed = discord.Embed().set_thumbnail(url="https://i.imgur.com/5QHH4If.jpg"))
-        await asyncio.sleep(1)
-        await m.delete()
+        log.debug(hatching_snakes[my_snake])
 
+        # the egg hatches in an animation ending on the baby snake, all in a single message
+        animation = await self.hatch_animations.get(my_snake)
         my_snake_embed = discord.Embed(description=":tada: Congrats! You hatched: **{0}**".format(my_snake))
-        my_snake_embed.set_thumbnail(url=my_snake_img)
+        my_snake_embed.set_image(url="attachment://hatching.gif")
         my_snake_embed.set_footer(
             text=" Owner: {0}#{1}".format(ctx.message.author.name, ctx.message.author.discriminator))
-        await channel.send(embed=my_snake_embed)
-
-    def generate_snake_image(self) -> bytes:
-        """
-        Generate a CGI snek using perlin noise
-        :return: the binary data of the PNG image
-        """
-        fac = perlin.PerlinNoiseFactory(dimension=1, octaves=2)
-        img_size = 200
-        margins = 50
-        start_x = random.randint(margins, img_size - margins)
-        start_y = random.randint(margins, img_size - margins)
-        points = [(start_x, start_y)]
-        snake_length = 12
-        snake_color = 0x15c7ea
-        text_color = 0xf2ea15
-        background_color = 0x0
-
-        for i in range(0, snake_length):
-            angle = math.radians(fac.get_plain_noise((1 / (snake_length + 1)) * (i + 1)) * 360)
-            curr_point = points[i]
-            segment_length = random.randint(15, 20)
-            next_x = curr_point[0] + segment_length * math.cos(angle)
-            next_y = curr_point[1] + segment_length * math.sin(angle)
-            points.append((next_x, next_y))
-
-        # normalize bounds
-        min_dimensions = [start_x, start_y]
-        max_dimensions = [start_x, start_y]
-        for p in points:
-            if p[0] < min_dimensions[0]:
-                min_dimensions[0] = p[0]
-            if p[0] > max_dimensions[0]:
-                max_dimensions[0] = p[0]
-            if p[1] < min_dimensions[1]:
-                min_dimensions[1] = p[1]
-            if p[1] > max_dimensions[1]:
-                max_dimensions[1] = p[1]
-
-        # shift towards middle
-        dimension_range = (max_dimensions[0] - min_dimensions[0], max_dimensions[1] - min_dimensions[1])
-        shift = (
-            img_size / 2 - (dimension_range[0] / 2 + min_dimensions[0]),
-            img_size / 2 - (dimension_range[1] / 2 + min_dimensions[1])
-        )
-
-        img = Image.new(mode='RGB', size=(img_size, img_size), color=background_color)
-        draw = ImageDraw(img)
-        for i in range(1, len(points)):
-            p = points[i]
-            prev = points[i - 1]
-            draw.line(
-                (shift[0] + prev[0], shift[1] + prev[1], shift[0] + p[0], shift[1] + p[1]),
-                width=8,
-                fill=snake_color
-            )
-        draw.multiline_text((img_size - margins, img_size - margins), text="snek\nit\nup", fill=text_color)
-        del draw
-        stream = io.BytesIO()
-        img.save(stream, format='PNG')
-        return stream.getvalue()
+        await channel.send(file=discord.File(animation, filename="hatching.gif"), embed=my_snake_embed)
 
 
 def setup(bot):
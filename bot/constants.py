@@ -25,3 +25,14 @@ BOT_AVATAR_URL = "https://raw.githubusercontent.com/discord-python/branding/mast
 
 # Bot internals
 HELP_PREFIX = "bot."
+
+# HTTP session (shared by all cogs)
+HTTP_CONNECTION_LIMIT = 100  # total simultaneous connections
+HTTP_CONNECTION_LIMIT_PER_HOST = 10  # simultaneous connections to the same host (ITIS, Wikipedia, ...)
+HTTP_KEEPALIVE_TIMEOUT = 60  # how long idle connections are kept open for reuse, in seconds
+HTTP_CONNECT_TIMEOUT = 5  # timeout for establishing a connection, in seconds
+HTTP_READ_TIMEOUT = 10  # timeout for each upstream request, in seconds
+
+# Executor for blocking work (shared by all cogs)
+EXECUTOR_WORKERS = 4  # threads doing the work
+EXECUTOR_MAX_PENDING = 32  # jobs waiting or running, past which new droppable jobs are rejected
@@ -0,0 +1,91 @@
+# coding=utf-8
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when too much work is already waiting in the :class:`Executor`
+    """
+
+
+class Executor:
+    """
+    Bot-wide pool for blocking (CPU-bound) work, so it doesn't run on the event loop that serves the gateway.
+
+    The work is done in threads: PIL releases the GIL while it decodes, draws and encodes images, which is most of
+    what we offload. At most ``max_pending`` jobs can be waiting or running at once; past that, jobs that can be
+    dropped are rejected with :class:`ExecutorBusy` instead of piling up.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, workers: int, max_pending: int):
+        self.loop = loop
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.run_time = 0.0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        """
+        :return: how many jobs are waiting for a free worker
+        """
+        return max(0, self.pending - self.workers)
+
+    async def run(self, func, *args, droppable: bool = True):
+        """
+        Runs a blocking function in the pool
+        :param func: the function to run
+        :param args: the arguments to call it with
+        :param droppable: whether the job can be rejected when the pool is busy (for work that a user can simply
+        ask for again, as opposed to work that is needed to keep a game going)
+        :return: the return value of the function
+        """
+        if droppable and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusy("{0} jobs are already pending".format(self.pending))
+
+        def job():
+            # timed from the worker thread, so the time spent getting back to the loop isn't counted
+            started = time.monotonic()
+            return func(*args), started, time.monotonic()
+
+        submitted = time.monotonic()
+        self.pending += 1
+        try:
+            result, started, finished = await self.loop.run_in_executor(self.pool, job)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        wait_time = started - submitted
+        self.completed += 1
+        self.run_time += finished - started
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        return result
+
+    def stats(self) -> str:
+        """
+        :return: a one-line summary of the executor metrics
+        """
+        completed = max(self.completed, 1)
+        return "{0} workers, {1} pending ({2} queued), {3} done, {4} failed, {5} rejected, " \
+               "avg run {6:.1f}ms, avg wait {7:.1f}ms, max wait {8:.1f}ms".format(
+                   self.workers, self.pending, self.queued, self.completed, self.failed, self.rejected,
+                   self.run_time / completed * 1000, self.wait_time / completed * 1000, self.max_wait_time * 1000)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,71 @@
+import io
+import logging
+
+from PIL import Image
+
+import aiohttp
+
+import discord
+
+from res.ladders.board import BOARD_PLAYER_SIZE, PLAYER_ICON_IMAGE_SIZE
+
+from bot.constants import HTTP_READ_TIMEOUT
+from bot.executor import Executor
+from bot.utils import LRUCache, SingleFlight
+
+# default amount of avatar sprites kept in memory
+AVATAR_CACHE_SIZE = 512
+
+log = logging.getLogger(__name__)
+
+
+def decode_sprite(data: bytes, size: int = BOARD_PLAYER_SIZE) -> Image.Image:
+    """
+    Decodes an avatar and resizes it to a board sprite (blocking)
+    :param data: the binary data of the avatar image
+    :param size: the width/height of the sprite
+    :return: the sprite
+    """
+    return Image.open(io.BytesIO(data)).convert('RGB').resize((size, size))
+
+
+class AvatarCache:
+    """
+    Process-wide cache of the board sprites of players, keyed by user id and avatar hash (so a new avatar is a
+    new entry). Sprites are shared between games and must not be modified.
+
+    Fetching the same avatar for several games at once only downloads and decodes it once.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, executor: Executor, max_size: int = AVATAR_CACHE_SIZE):
+        self.session = session
+        self.executor = executor
+        self.sprites = LRUCache(max_size)
+        self.fetches = SingleFlight()
+        self.downloads = 0
+
+    def __len__(self):
+        return len(self.sprites)
+
+    async def get(self, user: discord.Member) -> Image.Image:
+        """
+        Gets the board sprite of a user
+        :param user: the user
+        :return: the sprite
+        """
+        key = (user.id, user.avatar)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = await self.fetches.do(key, lambda: self._fetch(key, user))
+        return sprite
+
+    async def _fetch(self, key, user: discord.Member) -> Image.Image:
+        avatar_url = user.avatar_url_as(format='jpeg', size=PLAYER_ICON_IMAGE_SIZE)
+        self.downloads += 1
+        async with self.session.get(avatar_url, timeout=HTTP_READ_TIMEOUT) as res:
+            avatar_bytes = await res.read()
+        # needed for the game to go on, so never dropped
+        sprite = await self.executor.run(decode_sprite, avatar_bytes, droppable=False)
+        self.sprites.put(key, sprite)
+        log.debug("Cached the avatar sprite of {0}".format(user))
+        return sprite
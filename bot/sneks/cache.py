@@ -0,0 +1,132 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Dict, List
+
+from bot.sneks.sneks import Embeddable, SnakeDef, SnakeGroup
+
+# default location of the cache database, relative to the working directory (like sneks.names)
+CACHE_FILE = "sneks.cache.sqlite3"
+CACHE_TTL = 7 * 24 * 60 * 60  # one week, in seconds
+CACHE_MAX_ENTRIES = 5000
+
+# types that can be stored in the cache, by name
+CACHEABLE_TYPES = {
+    'SnakeDef': SnakeDef,
+    'SnakeGroup': SnakeGroup
+}
+
+log = logging.getLogger(__name__)
+
+
+class TaxonCache:
+    """
+    Disk-backed cache of finished snek lookups, keyed by normalized query.
+
+    Entries expire after ``ttl`` seconds, and the least recently used entries are evicted once there are more
+    than ``max_entries`` in the database. The database is a plain SQLite file, so it survives restarts.
+
+    Reading doesn't write to the database: access times are kept in memory, and written along with the next
+    :meth:`put` (or :meth:`flush`), which is when they are needed to evict entries.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # access times not written to the database yet, by query
+        self.accessed: Dict[str, float] = {}
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS taxa ("
+            "query TEXT PRIMARY KEY, kind TEXT NOT NULL, data TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS taxa_accessed ON taxa (accessed)")
+        self.db.commit()
+        log.debug("Opened taxon cache at {0} ({1} entries)".format(path, len(self)))
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM taxa").fetchone()[0]
+
+    def get(self, query: str) -> Embeddable:
+        """
+        Gets a cached snek
+        :param query: the normalized query
+        :return: the cached Embeddable, or None if it is not cached or has expired
+        """
+        row = self.db.execute("SELECT kind, data, created FROM taxa WHERE query = ?", (query,)).fetchone()
+        now = time.time()
+        if row is None or row[0] not in CACHEABLE_TYPES:
+            self.misses += 1
+            return None
+        kind, data, created = row
+        if now - created > self.ttl:
+            # deleted by the next flush, or replaced by the next put
+            self.misses += 1
+            return None
+        self.accessed[query] = now
+        self.hits += 1
+        return _load(kind, data)
+
+    def put(self, query: str, embeddable: Embeddable):
+        """
+        Stores a snek in the cache, evicting the least recently used entries if the cache is full
+        :param query: the normalized query
+        :param embeddable: the snek to store
+        """
+        kind = type(embeddable).__name__
+        if kind not in CACHEABLE_TYPES:
+            return
+        now = time.time()
+        self.accessed.pop(query, None)
+        self._write_accessed()
+        self.db.execute(
+            "INSERT OR REPLACE INTO taxa (query, kind, data, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (query, kind, json.dumps(embeddable.__dict__), now, now)
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self.db.execute(
+                "DELETE FROM taxa WHERE query IN (SELECT query FROM taxa ORDER BY accessed ASC LIMIT ?)",
+                (overflow,)
+            )
+            log.debug("Evicted {0} entries from the taxon cache".format(overflow))
+        self.db.commit()
+
+    def _write_accessed(self):
+        # writes the pending access times and deletes the expired entries, without committing
+        if len(self.accessed) > 0:
+            self.db.executemany("UPDATE taxa SET accessed = ? WHERE query = ?",
+                                [(accessed, query) for query, accessed in self.accessed.items()])
+            self.accessed.clear()
+        self.db.execute("DELETE FROM taxa WHERE created < ?", (time.time() - self.ttl,))
+
+    def flush(self):
+        """
+        Writes the pending access times, and deletes the expired entries
+        """
+        self._write_accessed()
+        self.db.commit()
+
+    def sneks(self) -> List[Embeddable]:
+        """
+        :return: all the (unexpired) sneks currently in the cache
+        """
+        rows = self.db.execute("SELECT kind, data FROM taxa WHERE created >= ?", (time.time() - self.ttl,))
+        return [_load(kind, data) for kind, data in rows if kind in CACHEABLE_TYPES]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def _load(kind: str, data: str) -> Embeddable:
+    embeddable = CACHEABLE_TYPES[kind]()
+    embeddable.__dict__.update(json.loads(data))
+    return embeddable
@@ -0,0 +1,162 @@
+import itertools
+import json
+import logging
+import sqlite3
+from collections import OrderedDict, deque
+from typing import Iterable, List, Tuple
+
+# default location of the corpus database, relative to the working directory (like the taxon cache)
+CORPUS_FILE = "sneks.corpus.sqlite3"
+CORPUS_MAX_USERS = 2000  # users whose messages are kept in memory, the others are only on disk
+
+log = logging.getLogger(__name__)
+
+# (guild id, user id)
+CorpusKey = Tuple[int, int]
+
+_generations = itertools.count()
+
+
+class _UserMessages:
+    # the recent messages of a user in a guild
+    def __init__(self, messages: Iterable[str], max_messages: int, backfilled: bool, first_id: int = None):
+        self.messages = deque(messages, maxlen=max_messages)
+        self.backfilled = backfilled
+        # the id of the oldest message added as it was sent: the history before it is what backfilling adds
+        self.first_id = first_id
+        self.dirty = False
+        # changes when the messages are replaced (rather than appended to), and how many were appended since
+        self.generation = next(_generations)
+        self.added = 0
+
+
+class MessageCorpus:
+    """
+    The most recent messages of every user, per guild, fed as messages are sent.
+
+    Each user keeps at most ``max_messages`` messages (older ones are dropped). Messages are kept in memory for
+    the ``max_users`` most recently used users, and written to a SQLite file by :meth:`flush`, so they survive
+    restarts. A user's older messages, sent before the first message added, can be added once with :meth:`backfill`.
+    """
+
+    def __init__(self, path: str = CORPUS_FILE, max_messages: int = 100, max_users: int = CORPUS_MAX_USERS):
+        self.path = path
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self.users: OrderedDict = OrderedDict()
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS corpus ("
+            "guild INTEGER NOT NULL, user INTEGER NOT NULL, messages TEXT NOT NULL, backfilled INTEGER NOT NULL, "
+            "first_id INTEGER, PRIMARY KEY (guild, user))"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(corpus)")]
+        if 'first_id' not in columns:
+            # corpus files written before the column existed
+            self.db.execute("ALTER TABLE corpus ADD COLUMN first_id INTEGER")
+        self.db.commit()
+        log.debug("Opened message corpus at {0} ({1} users)".format(path, len(self)))
+
+    def __len__(self):
+        # the users saved on disk
+        return self.db.execute("SELECT COUNT(*) FROM corpus").fetchone()[0]
+
+    def _user(self, key: CorpusKey) -> _UserMessages:
+        user = self.users.get(key)
+        if user is None:
+            row = self.db.execute(
+                "SELECT messages, backfilled, first_id FROM corpus WHERE guild = ? AND user = ?", key).fetchone()
+            if row is None:
+                user = _UserMessages([], self.max_messages, False)
+            else:
+                user = _UserMessages(json.loads(row[0]), self.max_messages, bool(row[1]), row[2])
+            self.users[key] = user
+        self.users.move_to_end(key)
+        return user
+
+    def add(self, guild_id: int, user_id: int, message_id: int, content: str):
+        """
+        Adds a message that was just sent
+        :param guild_id: the id of the guild it was sent in
+        :param user_id: the id of its author
+        :param message_id: the id of the message
+        :param content: the text of the message
+        """
+        user = self._user((guild_id, user_id))
+        if user.first_id is None:
+            user.first_id = message_id
+        user.messages.append(content)
+        user.added += 1
+        user.dirty = True
+
+    def messages(self, guild_id: int, user_id: int) -> List[str]:
+        """
+        :param guild_id: the id of the guild
+        :param user_id: the id of the user
+        :return: the recent messages of the user in the guild, oldest first
+        """
+        return list(self._user((guild_id, user_id)).messages)
+
+    def revision(self, guild_id: int, user_id: int) -> Tuple[int, int]:
+        """
+        :param guild_id: the id of the guild
+        :param user_id: the id of the user
+        :return: (generation, added): if the generation is the same as before, only the last ``added - before``
+        messages are new
+        """
+        user = self._user((guild_id, user_id))
+        return user.generation, user.added
+
+    def is_backfilled(self, guild_id: int, user_id: int) -> bool:
+        """
+        :return: whether the older messages of the user were already added with :meth:`backfill`
+        """
+        return self._user((guild_id, user_id)).backfilled
+
+    def first_id(self, guild_id: int, user_id: int) -> int:
+        """
+        :return: the id of the oldest message of the user added with :meth:`add`, or None if there is none: older
+        messages should only be looked for before it, to not add the same message twice
+        """
+        return self._user((guild_id, user_id)).first_id
+
+    def backfill(self, guild_id: int, user_id: int, contents: List[str]):
+        """
+        Adds older messages of a user, e.g. from the history of the guild, before the messages already known
+        :param guild_id: the id of the guild
+        :param user_id: the id of the user
+        :param contents: the text of the older messages (sent before :meth:`first_id`), oldest first
+        """
+        user = self._user((guild_id, user_id))
+        known = list(user.messages)
+        user.messages.clear()
+        # the most recent messages win if there are too many
+        user.messages.extend(contents + known)
+        user.backfilled = True
+        user.dirty = True
+        user.generation = next(_generations)
+        user.added = 0
+
+    def flush(self):
+        """
+        Writes the changed users to disk, then forgets the least recently used users past ``max_users``
+        """
+        dirty = [(key, user) for key, user in self.users.items() if user.dirty]
+        if len(dirty) > 0:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO corpus (guild, user, messages, backfilled, first_id) VALUES (?, ?, ?, ?, ?)",
+                [(key[0], key[1], json.dumps(list(user.messages)), int(user.backfilled), user.first_id)
+                 for key, user in dirty]
+            )
+            self.db.commit()
+            for _, user in dirty:
+                user.dirty = False
+            log.debug("Saved the messages of {0} users".format(len(dirty)))
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,152 @@
+import io
+import math
+import random
+
+from PIL import Image
+from PIL.ImageDraw import ImageDraw
+
+import numpy as np
+
+from bot.sneks import perlin
+
+IMAGE_SIZE = 200
+SNAKE_LENGTH = 12
+SNAKE_COLOR = 0x15c7ea
+TEXT_COLOR = 0xf2ea15
+BACKGROUND_COLOR = 0x0
+
+# contact sheets
+SHEET_SIZE = 512
+SHEET_MAX_COUNT = 64
+SHEET_MIN_SIZE = 128
+SHEET_MAX_SIZE = 1024
+SHEET_ROW_SPACING = 7.5  # distance between two sneks in the noise, so they don't look alike
+
+
+def format_seed(seed: int) -> str:
+    """
+    :param seed: a snek seed
+    :return: the seed as it is shown to users, e.g. "#1a2b3c4d"
+    """
+    return "#{0:08x}".format(seed)
+
+
+def parse_seed(text: str) -> int:
+    """
+    Parses a seed shown by :func:`format_seed`
+    :param text: the seed, e.g. "#1a2b3c4d"
+    :return: the seed
+    :raise ValueError: if the text is not a seed
+    """
+    if not text.startswith("#"):
+        raise ValueError("seeds start with #")
+    return int(text[1:], 16) & 0xffffffff
+
+
+def random_seed() -> int:
+    return random.getrandbits(32)
+
+
+def generate_snake_image(seed: int, img_size: int = IMAGE_SIZE) -> bytes:
+    """
+    Generate a CGI snek using perlin noise (the same seed always draws the same snek)
+    :param seed: the seed of the snek
+    :param img_size: the width/height of the image
+    :return: the binary data of the PNG image
+    """
+    rng = random.Random(seed)
+    fac = perlin.PerlinNoiseFactory(dimension=1, octaves=2, seed=seed)
+    margins = img_size // 4
+    start_x = rng.randint(margins, img_size - margins)
+    start_y = rng.randint(margins, img_size - margins)
+    points = [(start_x, start_y)]
+    snake_length = SNAKE_LENGTH
+
+    for i in range(0, snake_length):
+        angle = math.radians(fac.get_plain_noise((1 / (snake_length + 1)) * (i + 1)) * 360)
+        curr_point = points[i]
+        segment_length = rng.randint(15, 20)
+        next_x = curr_point[0] + segment_length * math.cos(angle)
+        next_y = curr_point[1] + segment_length * math.sin(angle)
+        points.append((next_x, next_y))
+
+    # normalize bounds
+    min_dimensions = [start_x, start_y]
+    max_dimensions = [start_x, start_y]
+    for p in points:
+        if p[0] < min_dimensions[0]:
+            min_dimensions[0] = p[0]
+        if p[0] > max_dimensions[0]:
+            max_dimensions[0] = p[0]
+        if p[1] < min_dimensions[1]:
+            min_dimensions[1] = p[1]
+        if p[1] > max_dimensions[1]:
+            max_dimensions[1] = p[1]
+
+    # shift towards middle
+    dimension_range = (max_dimensions[0] - min_dimensions[0], max_dimensions[1] - min_dimensions[1])
+    shift = (
+        img_size / 2 - (dimension_range[0] / 2 + min_dimensions[0]),
+        img_size / 2 - (dimension_range[1] / 2 + min_dimensions[1])
+    )
+
+    img = Image.new(mode='RGB', size=(img_size, img_size), color=BACKGROUND_COLOR)
+    draw = ImageDraw(img)
+    for i in range(1, len(points)):
+        p = points[i]
+        prev = points[i - 1]
+        draw.line(
+            (shift[0] + prev[0], shift[1] + prev[1], shift[0] + p[0], shift[1] + p[1]),
+            width=8,
+            fill=SNAKE_COLOR
+        )
+    draw.multiline_text((img_size - margins, img_size - margins), text="snek\nit\nup", fill=TEXT_COLOR)
+    del draw
+    stream = io.BytesIO()
+    img.save(stream, format='PNG')
+    return stream.getvalue()
+
+
+def generate_snake_sheet(seed: int, count: int, img_size: int = SHEET_SIZE) -> bytes:
+    """
+    Generate a grid of CGI sneks in a single image (the same seed always draws the same sheet)
+
+    Every snek samples its own row of the same 2D Perlin noise, so the paths of all the sneks are computed together
+    as array operations instead of one snek at a time.
+    :param seed: the seed of the sheet
+    :param count: the amount of sneks
+    :param img_size: the width/height of the image
+    :return: the binary data of the PNG image
+    """
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    cell_size = img_size // columns
+    scale = cell_size / IMAGE_SIZE
+
+    # the angle of every segment of every snek, in one noise evaluation
+    rng = np.random.RandomState(seed)
+    fac = perlin.PerlinNoiseFactory(dimension=2, octaves=2, seed=seed)
+    t = np.arange(1, SNAKE_LENGTH + 1) / (SNAKE_LENGTH + 1)
+    snek_rows = np.arange(count) * SHEET_ROW_SPACING
+    noise_points = np.stack(np.broadcast_arrays(t[None, :], snek_rows[:, None]), axis=-1).reshape(-1, 2)
+    angles = np.radians(fac.noise(noise_points).reshape(count, SNAKE_LENGTH) * 360)
+
+    # walk the segments, starting from (0, 0)
+    segment_lengths = rng.randint(15, 21, size=(count, SNAKE_LENGTH)) * scale
+    steps = np.stack((segment_lengths * np.cos(angles), segment_lengths * np.sin(angles)), axis=-1)
+    points = np.concatenate((np.zeros((count, 1, 2)), np.cumsum(steps, axis=1)), axis=1)
+
+    # center every snek in its cell
+    cells = np.stack((np.arange(count) % columns, np.arange(count) // columns), axis=-1) * cell_size
+    centers = (points.min(axis=1) + points.max(axis=1)) / 2
+    points += (cells + cell_size / 2 - centers)[:, None, :]
+
+    img = Image.new(mode='RGB', size=(columns * cell_size, rows * cell_size), color=BACKGROUND_COLOR)
+    draw = ImageDraw(img)
+    width = max(2, round(8 * scale))
+    for snek in points.tolist():
+        draw.line([tuple(p) for p in snek], width=width, fill=SNAKE_COLOR)
+    del draw
+    stream = io.BytesIO()
+    img.save(stream, format='PNG')
+    return stream.getvalue()
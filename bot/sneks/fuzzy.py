@@ -0,0 +1,110 @@
+import heapq
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Tuple
+
+from bot.sneks.sneks import normalize_name
+
+# how similar a query must be to a known name to be corrected (0 to 1)
+RESOLVE_THRESHOLD = 0.85
+# how much closer than any other known name it must be, so that ties aren't broken arbitrarily
+RESOLVE_MARGIN = 0.05
+# how similar a known name must be to a query to be suggested (0 to 1)
+SUGGEST_THRESHOLD = 0.6
+# how many candidates sharing trigrams with the query are scored precisely
+CANDIDATES = 20
+
+
+def trigrams(s: str) -> set:
+    """
+    Splits a string in its trigrams, padded so that the start and end of the string weigh more
+    :param s: the string to split
+    :return: the set of trigrams
+    """
+    padded = "  " + s + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """
+    Typo-tolerant in-memory index of snek names.
+
+    Candidates are found through an inverted trigram index, then the closest ones are scored with
+    :class:`difflib.SequenceMatcher`. Names are stored normalized (see :func:`bot.sneks.sneks.normalize_name`).
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.gram_counts: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name: str):
+        return normalize_name(name) in self.ids
+
+    def add(self, name: str):
+        """
+        Adds a name to the index (does nothing if it's already there)
+        :param name: the name to add
+        """
+        key = normalize_name(name)
+        if key == "" or key in self.ids:
+            return
+        name_id = len(self.names)
+        self.names.append(key)
+        self.ids[key] = name_id
+        grams = trigrams(key)
+        self.gram_counts.append(len(grams))
+        for gram in grams:
+            self.postings[gram].append(name_id)
+
+    def matches(self, query: str, limit: int) -> List[Tuple[float, str]]:
+        """
+        Finds the known names closest to a query
+        :param query: the name to search for
+        :param limit: the maximum amount of matches
+        :return: a list of (similarity, name), best match first
+        """
+        key = normalize_name(query)
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        # the Dice coefficient of the trigram sets is cheap, and good enough to pick candidates
+        candidates = heapq.nlargest(
+            CANDIDATES, shared.items(), key=lambda item: 2 * item[1] / (len(grams) + self.gram_counts[item[0]])
+        )
+        scored = [(SequenceMatcher(None, key, self.names[name_id]).ratio(), self.names[name_id])
+                  for name_id, _ in candidates]
+        scored.sort(key=lambda match: -match[0])
+        return scored[:limit]
+
+    def resolve(self, query: str) -> str:
+        """
+        Resolves a (possibly misspelled) query to a known name
+        :param query: the name to resolve
+        :return: the known name, or None if no name is close enough, or several are about as close
+        """
+        key = normalize_name(query)
+        if key in self.ids:
+            return key
+        best = self.matches(key, 2)
+        if len(best) == 0 or best[0][0] < RESOLVE_THRESHOLD:
+            return None
+        if len(best) > 1 and best[0][0] - best[1][0] < RESOLVE_MARGIN:
+            return None
+        return best[0][1]
+
+    def suggest(self, query: str, limit: int = 3) -> List[str]:
+        """
+        Suggests known names for a query that couldn't be found
+        :param query: the name that was searched
+        :param limit: the maximum amount of suggestions
+        :return: the suggested names, best match first
+        """
+        return [name for similarity, name in self.matches(query, limit) if similarity >= SUGGEST_THRESHOLD]
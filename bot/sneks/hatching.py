@@ -1,3 +1,28 @@
+import asyncio
+import io
+import logging
+from typing import Dict
+
+from PIL import Image, ImageDraw, ImageFont
+
+import aiohttp
+
+from bot.constants import HTTP_READ_TIMEOUT
+from bot.executor import Executor
+from bot.utils import SingleFlight
+
+# hatching animation defaults
+HATCH_FRAME_SIZE = 256
+HATCH_FRAME_DURATION = 1000  # milliseconds per egg frame
+HATCH_LAST_FRAME_DURATION = 5000  # milliseconds the baby snake is shown, before the animation ends
+HATCH_BACKGROUND = (47, 49, 54)  # the background of Discord embeds
+HATCH_FOREGROUND = (220, 221, 222)
+HATCH_TEXT_SCALE = 2  # the default font is tiny, the egg is scaled up without smoothing
+HATCH_CELL_SIZE = (6, 11)  # pixels per character, before scaling: the art needs a fixed width font
+
+log = logging.getLogger(__name__)
+
+
 h1 = '''```
         ----
        ------
@@ -42,3 +67,120 @@ hatching_snakes = {
     "Baby Garden Snake": "https://i.imgur.com/5vYx3ah.png",
     "Baby Cobra": "https://i.imgur.com/jk14ryt.png"
 }
+
+
+def render_egg(art: str, size: int = HATCH_FRAME_SIZE) -> Image.Image:
+    """
+    Draws an egg frame of the hatching animation (blocking)
+    :param art: the ASCII art of the egg, as sent in a code block
+    :param size: the width/height of the frame
+    :return: the frame
+    """
+    text = art.strip('`').strip('\n')
+    mask = Image.new('L', (size, size))
+    draw = ImageDraw.Draw(mask)
+    font = ImageFont.load_default()
+    cell_width, cell_height = HATCH_CELL_SIZE
+    # one character per cell, whether or not the default font is monospaced
+    for row, line in enumerate(text.split('\n')):
+        for column, character in enumerate(line):
+            if not character.isspace():
+                draw.text((column * cell_width, row * cell_height), character, fill=255, font=font)
+    # the exact extent of the text, whatever the font is
+    mask = mask.crop(mask.getbbox())
+    mask = mask.resize((mask.width * HATCH_TEXT_SCALE, mask.height * HATCH_TEXT_SCALE), Image.NEAREST)
+    frame = Image.new('RGB', (size, size), HATCH_BACKGROUND)
+    frame.paste(HATCH_FOREGROUND, ((size - mask.width) // 2, (size - mask.height) // 2), mask)
+    return frame
+
+
+def render_hatch(baby: bytes = None, size: int = HATCH_FRAME_SIZE) -> bytes:
+    """
+    Renders the whole hatching animation (blocking)
+    :param baby: the image data of the baby snake shown at the end, or None to end on the hatched egg
+    :param size: the width/height of the animation
+    :return: the animated GIF data
+    """
+    # decoded first, so data that isn't an image fails before anything is drawn
+    baby_image = Image.open(io.BytesIO(baby)).convert('RGBA') if baby is not None else None
+    frames = [render_egg(art, size) for art in hatching]
+    if baby_image is not None:
+        baby_image.thumbnail((size, size), Image.LANCZOS)
+        frame = Image.new('RGB', (size, size), HATCH_BACKGROUND)
+        frame.paste(baby_image, ((size - baby_image.width) // 2, (size - baby_image.height) // 2), baby_image)
+        frames.append(frame)
+    durations = [HATCH_FRAME_DURATION] * (len(frames) - 1) + [HATCH_LAST_FRAME_DURATION]
+    with io.BytesIO() as buffer:
+        # no loop count: the animation plays once and stays on the last frame
+        frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:], duration=durations)
+        return buffer.getvalue()
+
+
+class HatchAnimations:
+    """
+    The hatching animation of every baby snake, rendered once and kept in memory, so a hatch is a single upload
+    rather than a message edited frame by frame.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, executor: Executor):
+        self.session = session
+        self.executor = executor
+        self.animations: Dict[str, bytes] = {}
+        self.renders = SingleFlight()
+        # ends on the hatched egg, for the baby snakes whose image is unavailable
+        self.egg_animation: bytes = None
+
+    def __len__(self):
+        return len(self.animations)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(animation) for animation in self.animations.values())
+
+    async def prerender(self):
+        """
+        Renders the animation of every baby snake ahead of time, e.g. at startup
+        """
+        for name in hatching_snakes:
+            try:
+                await self.get(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Could not render the hatching animation of {0}".format(name))
+
+    async def get(self, name: str) -> bytes:
+        """
+        Gets the hatching animation of a baby snake
+        :param name: the name of the baby snake, from hatching_snakes
+        :return: the animated GIF data
+        """
+        animation = self.animations.get(name)
+        if animation is None:
+            animation = await self.renders.do(name, lambda: self._render(name))
+        return animation
+
+    async def _render(self, name: str) -> bytes:
+        try:
+            async with self.session.get(hatching_snakes[name], timeout=HTTP_READ_TIMEOUT) as res:
+                res.raise_for_status()
+                baby = await res.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # ends on the hatched egg this time, the next hatch tries again
+            log.warning("Could not download the image of {0}: {1}".format(name, e))
+            return await self._egg_animation()
+        try:
+            animation = await self.executor.run(render_hatch, baby, droppable=False)
+        except OSError as e:
+            # not an image, e.g. a placeholder page
+            log.warning("Could not decode the image of {0}: {1}".format(name, e))
+            return await self._egg_animation()
+        self.animations[name] = animation
+        log.debug("Rendered the hatching animation of {0} ({1} bytes)".format(name, len(animation)))
+        return animation
+
+    async def _egg_animation(self) -> bytes:
+        if self.egg_animation is None:
+            # rendered once, whichever baby snakes end up needing it
+            self.egg_animation = await self.renders.do(None, lambda: self.executor.run(render_hatch, droppable=False))
+        return self.egg_animation
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, List, NamedTuple
+
+import discord
+
+HISTORY_PAGE_SIZE = 100  # messages per history API call (the maximum allowed by Discord)
+
+log = logging.getLogger(__name__)
+
+
+class HistoryScan(NamedTuple):
+    """
+    The results of :func:`scan_history`
+    """
+    messages: List[discord.Message]  # oldest first
+    pages: int  # history API calls made
+    elapsed: float  # seconds
+    complete: bool  # whether enough messages were found before a budget ran out
+
+
+async def scan_history(channels: Iterable[discord.TextChannel],
+                       predicate: Callable[[discord.Message], Awaitable[bool]], wanted: int, concurrency: int = 4,
+                       channel_limit: int = 1000, page_budget: int = 20, time_budget: float = 10.0,
+                       before: discord.abc.Snowflake = None) -> HistoryScan:
+    """
+    Looks for messages in the history of several channels at once, newest first, and stops as soon as enough
+    were found or a budget ran out
+    :param channels: the channels to look in
+    :param predicate: coroutine function telling whether a message is wanted
+    :param wanted: how many messages are wanted
+    :param concurrency: the maximum amount of history API calls at the same time
+    :param channel_limit: the maximum amount of messages read in each channel
+    :param page_budget: the maximum amount of history API calls, across all channels
+    :param time_budget: the maximum time spent looking, in seconds
+    :param before: only look at the messages older than this message (e.g. the messages already known), or None
+    to start from the newest ones
+    :return: the most recent wanted messages found, and what it took to find them
+    """
+    start = time.monotonic()
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+    found = []
+    pages = 0
+
+    async def scan(channel: discord.TextChannel, before: discord.abc.Snowflake):
+        nonlocal pages
+        read = 0
+        while read < channel_limit:
+            async with semaphore:
+                if done.is_set() or pages >= page_budget:
+                    return
+                pages += 1
+                limit = min(HISTORY_PAGE_SIZE, channel_limit - read)
+                page_size = 0
+                # a single API call, filtered as the messages come in
+                async for message in channel.history(limit=limit, before=before):
+                    page_size += 1
+                    before = message
+                    if await predicate(message):
+                        found.append(message)
+            read += page_size
+            if len(found) >= wanted or pages >= page_budget:
+                done.set()
+            if page_size < limit:
+                # reached the beginning of the channel
+                return
+
+    async def safe_scan(channel: discord.TextChannel):
+        try:
+            await scan(channel, before)
+        except discord.HTTPException as e:
+            # e.g. a channel the bot can't read
+            log.debug("Could not read the history of #{0}: {1}".format(channel, e))
+
+    tasks = [asyncio.ensure_future(safe_scan(channel)) for channel in channels]
+    try:
+        if len(tasks) > 0:
+            await asyncio.wait(tasks, timeout=time_budget)
+    finally:
+        # whatever is still running is past the time budget (or the scan itself was cancelled)
+        for task in tasks:
+            task.cancel()
+
+    found.sort(key=lambda message: message.created_at)
+    return HistoryScan(
+        messages=found[-wanted:] if wanted > 0 else [],
+        pages=pages,
+        elapsed=time.monotonic() - start,
+        complete=len(found) >= wanted
+    )
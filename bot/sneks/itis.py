@@ -0,0 +1,183 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import List, NamedTuple
+from urllib import parse
+
+import aiohttp
+
+from bot.constants import HTTP_READ_TIMEOUT
+
+# the ITIS JSON web service, see https://itis.gov/ws_description.html
+ITIS_JSON_SERVICE_URL = "https://itis.gov/ITISWebService/jsonservice/{0}"
+ITIS_JSON_SERVICE_SEARCH_SCIENTIFIC = ITIS_JSON_SERVICE_URL.format("searchByScientificName?srchKey={0}")
+ITIS_JSON_SERVICE_SEARCH_COMMON = ITIS_JSON_SERVICE_URL.format("searchByCommonName?srchKey={0}")
+ITIS_JSON_SERVICE_FULLRECORD = ITIS_JSON_SERVICE_URL.format("getFullRecordFromTSN?tsn={0}")
+ITIS_JSON_SERVICE_FULLHIERARCHY = ITIS_JSON_SERVICE_URL.format("getFullHierarchyFromTSN?tsn={0}")
+ITIS_JSON_SERVICE_KINGDOM = ITIS_JSON_SERVICE_URL.format("getKingdomNameFromTSN?tsn={0}")
+ANIMAL_KINGDOM = 'Animalia'
+# the human-readable page of a taxon
+ITIS_TSN_URL = "https://itis.gov/servlet/SingleRpt/SingleRpt?search_topic=TSN&search_value={0}"
+
+
+class TaxonRecord(NamedTuple):
+    """
+    The ITIS data about a taxon that is needed to build a snek, wherever it came from (web service or mirror)
+    """
+    tsn: str
+    scientific_name: str
+    combined_name: str
+    rank: str
+    parent_name: str
+    family: str
+    common_names: List[str]  # English common names only
+    geo: List[str]
+
+
+class NameMatch(NamedTuple):
+    """
+    A name found by an ITIS search
+    """
+    tsn: str
+    name: str
+
+
+def _same_name(a: str, b: str) -> bool:
+    return a.lower().split() == b.lower().split()
+
+
+def parse_scientific_search(text: str, name: str) -> List[NameMatch]:
+    """
+    Parses the results of a scientific name search, keeping only the animals named exactly like the query
+    (the web service also returns partial matches)
+    :param text: the JSON response
+    :param name: the name that was searched
+    :return: the matching names
+    """
+    results = json.loads(text)['scientificNames']
+    return [NameMatch(tsn=r['tsn'], name=r['combinedName']) for r in results
+            if r is not None and r['kingdom'] == ANIMAL_KINGDOM and _same_name(r['combinedName'], name)]
+
+
+def parse_common_search(text: str, name: str) -> List[NameMatch]:
+    """
+    Parses the results of a common name search, keeping only the names that are exactly like the query
+    (of any kingdom: the results don't say, see :func:`kingdom_name`)
+    :param text: the JSON response
+    :param name: the name that was searched
+    :return: the matching names
+    """
+    results = json.loads(text)['commonNames']
+    return [NameMatch(tsn=r['tsn'], name=r['commonName']) for r in results
+            if r is not None and _same_name(r['commonName'], name)]
+
+
+async def _get_text(session: aiohttp.ClientSession, url: str) -> str:
+    async with session.get(url, timeout=HTTP_READ_TIMEOUT) as res:
+        return await res.text(encoding='iso-8859-1')
+
+
+async def search_scientific_name(session: aiohttp.ClientSession, name: str) -> List[NameMatch]:
+    """
+    Searches ITIS for an animal by scientific name
+    :param session: the aiohttp HTTP session
+    :param name: the scientific name
+    :return: the exact matches
+    """
+    text = await _get_text(session, ITIS_JSON_SERVICE_SEARCH_SCIENTIFIC.format(parse.quote(name)))
+    return parse_scientific_search(text, name)
+
+
+async def search_common_name(session: aiohttp.ClientSession, name: str) -> List[NameMatch]:
+    """
+    Searches ITIS for a taxon by common name
+    :param session: the aiohttp HTTP session
+    :param name: the common name
+    :return: the exact matches
+    """
+    text = await _get_text(session, ITIS_JSON_SERVICE_SEARCH_COMMON.format(parse.quote(name)))
+    return parse_common_search(text, name)
+
+
+async def kingdom_name(session: aiohttp.ClientSession, tsn: str) -> str:
+    """
+    Finds the kingdom of a taxon
+    :param session: the aiohttp HTTP session
+    :param tsn: the taxonomic serial number of the taxon
+    :return: the name of the kingdom, e.g. "Animalia"
+    """
+    return json.loads(await _get_text(session, ITIS_JSON_SERVICE_KINGDOM.format(tsn)))['kingdomName']
+
+
+async def find_tsn(session: aiohttp.ClientSession, name: str) -> str:
+    """
+    Finds an animal by name, preferring scientific names over common names (like the ITIS search page).
+    Both searches run at the same time.
+    :param session: the aiohttp HTTP session
+    :param name: the name to search for
+    :return: the TSN of the animal, or None if no animal is named like that
+    """
+    scientific, common = await asyncio.gather(
+        search_scientific_name(session, name),
+        search_common_name(session, name)
+    )
+    if len(scientific) > 0:
+        return scientific[0].tsn
+    # common names are shared across kingdoms (e.g. by plants), the kingdoms are checked all at once
+    tsns = list(OrderedDict.fromkeys(match.tsn for match in common))
+    kingdoms = await asyncio.gather(*(kingdom_name(session, tsn) for tsn in tsns))
+    return next((tsn for tsn, kingdom in zip(tsns, kingdoms) if kingdom == ANIMAL_KINGDOM), None)
+
+
+async def full_record(session: aiohttp.ClientSession, tsn: str) -> dict:
+    """
+    Fetches the full ITIS record of a taxon
+    :param session: the aiohttp HTTP session
+    :param tsn: the taxonomic serial number of the taxon
+    :return: the decoded JSON record
+    """
+    return json.loads(await _get_text(session, ITIS_JSON_SERVICE_FULLRECORD.format(tsn)))
+
+
+async def family(session: aiohttp.ClientSession, tsn: str) -> str:
+    """
+    Finds the family of a taxon from its ITIS hierarchy
+    :param session: the aiohttp HTTP session
+    :param tsn: the taxonomic serial number of the taxon
+    :return: the name of the family, or "Unknown"
+    """
+    hier_data = json.loads(await _get_text(session, ITIS_JSON_SERVICE_FULLHIERARCHY.format(tsn)))
+    family_name = "Unknown"
+    for hier in hier_data['hierarchyList']:
+        if hier['rankName'] == 'Family':
+            family_name = hier['taxonName']
+    return family_name
+
+
+def parse_full_record(data: dict, family_name: str) -> TaxonRecord:
+    """
+    Parses a full ITIS record from the JSON web service
+    :param data: the decoded JSON record
+    :param family_name: the family of the taxon, which is not part of the full record
+    :return: the parsed record
+    """
+    common_names = []
+    for common_name_tag in data['commonNameList']['commonNames']:
+        if common_name_tag is None:
+            continue
+        if common_name_tag['language'] == "English":
+            common_names.append(common_name_tag['commonName'])
+    geo = []
+    for geoDivisions in data['geographicDivisionList']['geoDivisions']:
+        if geoDivisions is not None:
+            geo.append(geoDivisions['geographicValue'])
+    return TaxonRecord(
+        tsn=data['tsn'],
+        scientific_name=data['hierarchyUp']['taxonName'],
+        combined_name=data['scientificName']['combinedName'],
+        rank=data['hierarchyUp']['rankName'],
+        parent_name=data['hierarchyUp']['parentName'],
+        family=family_name,
+        common_names=common_names,
+        geo=geo
+    )
@@ -0,0 +1,117 @@
+import random
+import re
+from array import array
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+SENTENCE_SEPARATOR = re.compile(r"[.!?\n]")
+BOUNDARY = 0  # the token id of the beginning (and end) of a sentence
+MARKOV_ORDER = 2  # how many previous words are used to pick the next one, at most
+MAX_WORDS = 50
+
+
+class _Transitions:
+    # the tokens that followed a context, with how many times they did
+    __slots__ = ('successors', 'counts', 'index', 'cumulative')
+
+    def __init__(self):
+        self.successors = array('I')
+        self.counts = array('I')
+        self.index: Dict[int, int] = {}
+        self.cumulative: List[int] = None  # cumulative counts, built when sampling after a change
+
+    def add(self, token: int):
+        i = self.index.get(token)
+        if i is None:
+            self.index[token] = len(self.successors)
+            self.successors.append(token)
+            self.counts.append(1)
+        else:
+            self.counts[i] += 1
+        self.cumulative = None
+
+    def sample(self, rng: random.Random) -> int:
+        if self.cumulative is None:
+            self.cumulative = list(accumulate(self.counts))
+        return rng.choices(self.successors, cum_weights=self.cumulative)[0]
+
+
+class MarkovModel:
+    """
+    Word-level Markov chain text model, trained incrementally.
+
+    Words are interned as integer ids, and the words following every context (the up to ``order`` previous words)
+    are kept in arrays with their counts. Generating backs off to shorter contexts when a longer one was never seen.
+    """
+
+    def __init__(self, order: int = MARKOV_ORDER):
+        self.order = order
+        self.tokens: List[str] = ['']
+        self.token_ids: Dict[str, int] = {'': BOUNDARY}
+        self.transitions: Dict[Tuple[int, ...], _Transitions] = {}
+        self.texts = 0
+
+    def _intern(self, word: str) -> int:
+        token = self.token_ids.get(word)
+        if token is None:
+            token = len(self.tokens)
+            self.token_ids[word] = token
+            self.tokens.append(word)
+        return token
+
+    def add_text(self, text: str):
+        """
+        Trains the model on more text
+        :param text: the text, split in sentences on punctuation and new lines
+        """
+        self.texts += 1
+        for sentence in SENTENCE_SEPARATOR.split(text):
+            words = sentence.split()
+            if len(words) == 0:
+                continue
+            tokens = [BOUNDARY] + [self._intern(word) for word in words] + [BOUNDARY]
+            for i in range(1, len(tokens)):
+                for length in range(1, min(self.order, i) + 1):
+                    context = tuple(tokens[i - length:i])
+                    transitions = self.transitions.get(context)
+                    if transitions is None:
+                        transitions = self.transitions[context] = _Transitions()
+                    transitions.add(tokens[i])
+
+    def generate(self, max_words: int = MAX_WORDS, rng: random.Random = None) -> str:
+        """
+        Generates a sentence
+        :param max_words: the maximum amount of words in the sentence
+        :param rng: the random generator, defaults to the random module
+        :return: the sentence, or None if the model doesn't know any word
+        """
+        rng = rng or random
+        history = [BOUNDARY]
+        words = []
+        while len(words) < max_words:
+            # the longest context that was seen
+            for length in range(min(self.order, len(history)), 0, -1):
+                transitions = self.transitions.get(tuple(history[-length:]))
+                if transitions is not None:
+                    break
+            else:
+                break
+            token = transitions.sample(rng)
+            if token == BOUNDARY:
+                break
+            words.append(self.tokens[token])
+            history.append(token)
+        return " ".join(words) if len(words) > 0 else None
+
+
+def train_model(texts: List[str], order: int = MARKOV_ORDER) -> MarkovModel:
+    """
+    Trains a new model (blocking)
+    :param texts: the texts to train on
+    :param order: the order of the model
+    :return: the trained model
+    """
+    model = MarkovModel(order)
+    for text in texts:
+        model.add_text(text)
+    return model
@@ -0,0 +1,74 @@
+import logging
+import sqlite3
+
+from bot.sneks.itis import TaxonRecord
+
+# default location of the mirror database, as built by tools/itismirror.py
+MIRROR_FILE = "itis.sqlite3"
+
+log = logging.getLogger(__name__)
+
+
+class ItisMirror:
+    """
+    Read-only access to a local mirror of the Serpentes subtree of ITIS.
+
+    The mirror is built from an ITIS database dump by ``tools/itismirror.py``. All names are stored normalized
+    (see :func:`bot.sneks.sneks.normalize_name`) and indexed, so lookups never touch the network.
+    """
+
+    def __init__(self, path: str = MIRROR_FILE):
+        self.path = path
+        # opened read-only, the bot never writes to the mirror
+        self.db = sqlite3.connect("file:{0}?mode=ro".format(path), uri=True)
+        log.debug("Opened ITIS mirror at {0} ({1} taxa)".format(path, len(self)))
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM taxa").fetchone()[0]
+
+    def find_tsn(self, name: str) -> str:
+        """
+        Finds a taxon by name, preferring scientific names over common names (like the ITIS search page)
+        :param name: the normalized name to search for
+        :return: the TSN of the taxon, or None if there is no such snek
+        """
+        row = self.db.execute("SELECT tsn FROM taxa WHERE scientific_key = ? LIMIT 1", (name,)).fetchone()
+        if row is None:
+            row = self.db.execute("SELECT tsn FROM common_names WHERE name_key = ? LIMIT 1", (name,)).fetchone()
+        return str(row[0]) if row is not None else None
+
+    def record(self, tsn: str) -> TaxonRecord:
+        """
+        Gets the full record of a taxon
+        :param tsn: the taxonomic serial number of the taxon
+        :return: the record, or None if the TSN is not in the mirror
+        """
+        row = self.db.execute(
+            "SELECT scientific_name, rank, parent_name, family FROM taxa WHERE tsn = ?", (tsn,)
+        ).fetchone()
+        if row is None:
+            return None
+        scientific_name, rank, parent_name, family = row
+        common_names = [r[0] for r in self.db.execute(
+            "SELECT name FROM common_names WHERE tsn = ? AND language = 'English' ORDER BY name", (tsn,))]
+        geo = [r[0] for r in self.db.execute("SELECT value FROM geo WHERE tsn = ? ORDER BY value", (tsn,))]
+        return TaxonRecord(
+            tsn=str(tsn),
+            scientific_name=scientific_name,
+            combined_name=scientific_name,
+            rank=rank,
+            parent_name=parent_name,
+            family=family,
+            common_names=common_names,
+            geo=geo
+        )
+
+    def names(self):
+        """
+        :return: every scientific and common name in the mirror, normalized
+        """
+        rows = self.db.execute("SELECT scientific_key FROM taxa UNION SELECT name_key FROM common_names")
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.db.close()
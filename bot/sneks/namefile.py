@@ -0,0 +1,92 @@
+import bisect
+import mmap
+import os
+import struct
+from typing import Iterable
+
+# file layout (all little-endian):
+#   header: magic, version, reserved, name count, crawl timestamp (unix time)
+#   offsets: (count + 1) uint32, where name i is blob[offsets[i]:offsets[i + 1]]
+#   blob: the UTF-8 encoded names, sorted by their encoded bytes and concatenated
+NAME_FILE_MAGIC = b"SNEKNAME"
+NAME_FILE_VERSION = 1
+HEADER = struct.Struct("<8sHHId")
+OFFSET = struct.Struct("<I")
+
+
+def write_name_file(path: str, names: Iterable[str], crawled_at: float):
+    """
+    Writes a name file, replacing any existing file atomically
+    :param path: the path of the file
+    :param names: the names to write (duplicates are removed)
+    :param crawled_at: when the names were crawled, as a unix timestamp
+    """
+    encoded = sorted({name.encode('utf-8') for name in names})
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(NAME_FILE_MAGIC, NAME_FILE_VERSION, 0, len(encoded), crawled_at))
+        out.write(struct.pack("<{0}I".format(len(offsets)), *offsets))
+        out.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+
+
+class NameFile:
+    """
+    Read-only, memory-mapped sequence of names written by :func:`write_name_file`.
+
+    Names are decoded on access, so opening a file costs the same no matter how many names it has.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.crawled_at = HEADER.unpack_from(self.map, 0)
+        if magic != NAME_FILE_MAGIC:
+            raise ValueError("{0} is not a snek name file".format(path))
+        if version != NAME_FILE_VERSION:
+            raise ValueError("{0} has version {1}, expected {2}".format(path, version, NAME_FILE_VERSION))
+        self.blob_start = HEADER.size + (self.count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self.count
+
+    def _encoded(self, index: int) -> bytes:
+        start, end = struct.unpack_from("<2I", self.map, HEADER.size + index * OFFSET.size)
+        return self.map[self.blob_start + start:self.blob_start + end]
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("name index out of range")
+        return self._encoded(index).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def __contains__(self, name: str):
+        encoded = name.encode('utf-8')
+        # binary search over the sorted names, without decoding them
+        index = bisect.bisect_left(_EncodedView(self), encoded)
+        return index < self.count and self._encoded(index) == encoded
+
+    def close(self):
+        self.map.close()
+
+
+class _EncodedView:
+    # a sequence of the encoded names, for bisect
+    def __init__(self, name_file: NameFile):
+        self.name_file = name_file
+
+    def __len__(self):
+        return len(self.name_file)
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.name_file._encoded(index)
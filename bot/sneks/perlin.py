@@ -8,6 +8,12 @@ import random
 # Licensed under ISC
 from itertools import product
 
+import numpy as np
+
+# Number of distinct gradients, and size of the permutation table used to
+# pick one for each grid point.  Must be a power of 2.
+PERMUTATION_SIZE = 256
+
 
 def smoothstep(t):
     """Smooth curve with a zero derivative at 0 and 1, making it useful for
@@ -25,11 +31,12 @@ class PerlinNoiseFactory(object):
     """Callable that produces Perlin noise for an arbitrary point in an
     arbitrary number of dimensions.  The underlying grid is aligned with the
     integers.
-    There is no limit to the coordinates used; new gradients are generated on
-    the fly as necessary.
+    There is no limit to the coordinates used; like improved Perlin noise,
+    each grid point picks one of a fixed set of gradients by hashing its
+    coordinates through a permutation table, so memory use is constant.
     """
 
-    def __init__(self, dimension, octaves=1, tile=(), unbias=False):
+    def __init__(self, dimension, octaves=1, tile=(), unbias=False, seed=None):
         """Create a new Perlin noise factory in the given number of dimensions,
         which should be an integer and at least 1.
         More octaves create a foggier and more-detailed noise pattern.  More
@@ -41,6 +48,9 @@ class PerlinNoiseFactory(object):
         If ``unbias`` is true, the smoothstep function will be applied to the
         output before returning it, to counteract some of Perlin noise's
         significant bias towards the center of its output range.
+        ``seed`` picks the permutation table and gradients: the same seed
+        always produces the same noise.  If it is None, a random seed is used
+        (and stored in ``self.seed``).
         """
         self.dimension = dimension
         self.octaves = octaves
@@ -51,26 +61,49 @@ class PerlinNoiseFactory(object):
         # by this to scale to ±1
         self.scale_factor = 2 * dimension ** -0.5
 
-        self.gradient = {}
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        rng = random.Random(seed)
+
+        permutation = list(range(PERMUTATION_SIZE))
+        rng.shuffle(permutation)
+        self.permutation = permutation
+        self.permutation_array = np.array(permutation)
+
+        # Tuples for the scalar path, an array for the batch path
+        self.gradients = [self._generate_gradient(rng) for _ in range(PERMUTATION_SIZE)]
+        self.gradient_array = np.array(self.gradients)
 
-    def _generate_gradient(self):
+    def _generate_gradient(self, rng):
         # Generate a random unit vector at each grid point -- this is the
         # "gradient" vector, in that the grid tile slopes towards it
 
         # 1 dimension is special, since the only unit vector is trivial;
         # instead, use a slope between -1 and 1
         if self.dimension == 1:
-            return (random.uniform(-1, 1),)
+            return (rng.uniform(-1, 1),)
 
         # Generate a random point on the surface of the unit n-hypersphere;
         # this is the same as a random unit vector in n dimensions.  Thanks
         # to: http://mathworld.wolfram.com/SpherePointPicking.html
         # Pick n normal random variables with stddev 1
-        random_point = [random.gauss(0, 1) for _ in range(self.dimension)]
+        random_point = [rng.gauss(0, 1) for _ in range(self.dimension)]
         # Then scale the result to a unit vector
         scale = sum(n * n for n in random_point) ** -0.5
         return tuple(coord * scale for coord in random_point)
 
+    def _gradient_index(self, grid_point, periods):
+        # Hash the grid point through the permutation table, one coordinate
+        # at a time.  Coordinates are wrapped to their tiling period first, so
+        # that opposite edges of a tile share their gradients.
+        index = 0
+        for coord, period in zip(grid_point, periods):
+            if period:
+                coord %= period
+            index = self.permutation[(index + coord) & (PERMUTATION_SIZE - 1)]
+        return index
+
     def get_plain_noise(self, *point):
         """Get plain noise for a single point, without taking into account
         either octaves or tiling.
@@ -78,7 +111,12 @@ class PerlinNoiseFactory(object):
         if len(point) != self.dimension:
             raise ValueError("Expected {0} values, got {1}".format(
                 self.dimension, len(point)))
+        return self._plain_noise(point, (0,) * self.dimension)
 
+    def _plain_noise(self, point, periods):
+        """Plain noise for a single point, with grid points wrapped to the
+        given periods (0 for no wrapping) in each dimension.
+        """
         # Build a list of the (min, max) bounds in each dimension
         grid_coords = []
         for coord in point:
@@ -91,9 +129,7 @@ class PerlinNoiseFactory(object):
         # gradient's "influence" on the chosen point.
         dots = []
         for grid_point in product(*grid_coords):
-            if grid_point not in self.gradient:
-                self.gradient[grid_point] = self._generate_gradient()
-            gradient = self.gradient[grid_point]
+            gradient = self.gradients[self._gradient_index(grid_point, periods)]
 
             dot = 0
             for i in range(self.dimension):
@@ -113,11 +149,7 @@ class PerlinNoiseFactory(object):
             dim -= 1
             s = smoothstep(point[dim] - grid_coords[dim][0])
 
-            next_dots = []
-            while dots:
-                next_dots.append(lerp(s, dots.pop(0), dots.pop(0)))
-
-            dots = next_dots
+            dots = [lerp(s, dots[i], dots[i + 1]) for i in range(0, len(dots), 2)]
 
         return dots[0] * self.scale_factor
 
@@ -129,12 +161,14 @@ class PerlinNoiseFactory(object):
         for o in range(self.octaves):
             o2 = 1 << o
             new_point = []
+            periods = []
             for i, coord in enumerate(point):
                 coord *= o2
                 if self.tile[i]:
                     coord %= self.tile[i] * o2
                 new_point.append(coord)
-            ret += self.get_plain_noise(*new_point) / o2
+                periods.append(self.tile[i] * o2)
+            ret += self._plain_noise(new_point, periods) / o2
 
         # Need to scale n back down since adding all those extra octaves has
         # probably expanded it beyond ±1
@@ -156,3 +190,79 @@ class PerlinNoiseFactory(object):
             ret = r * 2 - 1
 
         return ret
+
+    def _gradient_indices(self, grid_points, periods):
+        """Vectorized version of _gradient_index, for an array of integer
+        grid points of shape (..., dimension).
+        """
+        index = np.zeros(grid_points.shape[:-1], dtype=np.int64)
+        for i in range(self.dimension):
+            coord = grid_points[..., i]
+            if periods[i]:
+                coord = coord % periods[i]
+            index = self.permutation_array[(index + coord) & (PERMUTATION_SIZE - 1)]
+        return index
+
+    def get_plain_noise_batch(self, points, periods=None):
+        """Vectorized version of get_plain_noise, for an array of points of
+        shape (n, dimension).  Returns an array of n values.
+        Grid points are wrapped to ``periods`` in each dimension, if given.
+        """
+        if periods is None:
+            periods = (0,) * self.dimension
+        points = np.asarray(points, dtype=float)
+        n = len(points)
+        min_coords = np.floor(points)
+
+        # All 2^dimension corners of each point's grid cell, in the same order
+        # as product() in get_plain_noise: the last dimension alternates first
+        offsets = np.array(list(product((0, 1), repeat=self.dimension)))
+        corners = min_coords[:, None, :] + offsets[None, :, :]
+        gradients = self.gradient_array[self._gradient_indices(corners.astype(np.int64), periods)]
+
+        # Summed one dimension at a time, like the scalar path, so the results
+        # are identical
+        dots = np.zeros(corners.shape[:2])
+        for i in range(self.dimension):
+            dots += gradients[:, :, i] * (points[:, None, i] - corners[:, :, i])
+
+        # Collapse the last dimension of the cell until a single value is left
+        dots = dots.reshape((n,) + (2,) * self.dimension)
+        for dim in reversed(range(self.dimension)):
+            s = smoothstep(points[:, dim] - min_coords[:, dim]).reshape((n,) + (1,) * dim)
+            dots = lerp(s, dots[..., 0], dots[..., 1])
+
+        return dots * self.scale_factor
+
+    def noise(self, points):
+        """Get the value of this Perlin noise function at many points at once.
+        ``points`` is an array of shape (n, dimension), or of shape (n,) in 1
+        dimension.  Returns an array of n values, the same as calling this
+        object on each point.
+        """
+        points = np.asarray(points, dtype=float)
+        if points.ndim == 1 and self.dimension == 1:
+            points = points[:, None]
+        if points.ndim != 2 or points.shape[1] != self.dimension:
+            raise ValueError("Expected points of shape (n, {0}), got {1}".format(
+                self.dimension, points.shape))
+
+        ret = np.zeros(len(points))
+        tile = np.array(self.tile[:self.dimension], dtype=float)
+        for o in range(self.octaves):
+            o2 = 1 << o
+            new_points = points * o2
+            tiled = tile != 0
+            new_points[:, tiled] %= tile[tiled] * o2
+            periods = [int(period) * o2 for period in tile]
+            ret += self.get_plain_noise_batch(new_points, periods) / o2
+
+        ret /= 2 - 2 ** (1 - self.octaves)
+
+        if self.unbias:
+            r = (ret + 1) / 2
+            for _ in range(int(self.octaves / 2 + 0.5)):
+                r = smoothstep(r)
+            ret = r * 2 - 1
+
+        return ret
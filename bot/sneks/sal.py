@@ -1,20 +1,33 @@
-import io
-import math
+import asyncio
+import logging
 import os
 import random
+import time
 from typing import Dict, List
 
 from PIL import Image
 
-import aiohttp
-
 import discord
 
-from res.ladders.board import BOARD, BOARD_MARGIN, BOARD_PLAYER_SIZE, BOARD_TILE_SIZE, MAX_PLAYERS, \
-    PLAYER_ICON_IMAGE_SIZE
+from res.ladders.board import BOARD, MAX_PLAYERS
+
+from bot.sneks.salboard import BoardCanvas
+
+log = logging.getLogger(__name__)
+
+# how long to wait for more events before sending them, in seconds (e.g. several players rolling at once)
+OUTPUT_DELAY = 0.5
+MESSAGE_MAX_LENGTH = 2000
 
 
 class SnakeAndLaddersGame:
+    """
+    A game of Snakes and Ladders in a channel.
+
+    Commands are submitted to the game and applied one at a time, in order, by the game's own task: a command
+    that waits for the network (e.g. drawing the board) can't interleave with the next one.
+    """
+
     def __init__(self, snakes, channel: discord.TextChannel, author: discord.Member):
         self.snakes = snakes
         self.channel = channel
@@ -24,134 +37,236 @@ class SnakeAndLaddersGame:
         self.player_tiles: Dict[int, int] = {}
         self.round_has_rolled: Dict[int, bool] = {}
         self.avatar_images: Dict[int, Image] = {}
+        self.board = BoardCanvas()
+        # what the game has to say, merged into as few messages as possible
+        self.output: List[str] = []
+        self.flush_task: asyncio.Task = None
+        self.messages_sent = 0
+        self.last_activity = time.monotonic()
+        self.commands = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._run())
+
+    def submit(self, handler, *args):
+        """
+        Queues a command, to be applied after the commands already submitted
+        :param handler: the coroutine function of the game handling the command, e.g. player_roll
+        :param args: the arguments of the handler
+        """
+        self.commands.put_nowait((handler, args))
+
+    async def _run(self):
+        while self.state != 'over':
+            handler, args = await self.commands.get()
+            if handler is None:
+                # woken up by _destruct
+                continue
+            try:
+                await handler(*args)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("S&L command {0} failed in #{1}".format(handler.__name__, self.channel))
+        # whatever is left was sent for a game that has ended
+        log.debug("S&L game in #{0} is over, dropping {1} commands".format(self.channel, self.commands.qsize()))
+
+    @property
+    def idle_time(self) -> float:
+        """
+        :return: how long nobody has done anything in the game, in seconds
+        """
+        return time.monotonic() - self.last_activity
+
+    @property
+    def image_bytes(self) -> int:
+        """
+        :return: how much memory the images of the game take, in bytes (avatar sprites are counted even though they
+        can be shared with other games)
+        """
+        return self.board.size_bytes + sum(
+            avatar.width * avatar.height * len(avatar.getbands()) for avatar in self.avatar_images.values())
+
+    def _touch(self):
+        self.last_activity = time.monotonic()
+
+    def evict(self, reason: str):
+        """
+        Ends the game without a winner, e.g. because it was abandoned. This doesn't wait for the command being
+        applied, if any.
+        :param reason: why the game is ending, told to the players
+        """
+        if self.state == 'over':
+            return
+        self._say("**Snakes and Ladders**: The game has been closed " + reason + ".")
+        self._destruct()
+
+    def _say(self, text: str):
+        # buffers a line, sent with whatever else happens in the next OUTPUT_DELAY seconds
+        self.output.append(text)
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(OUTPUT_DELAY)
+        self.flush_task = None
+        try:
+            await self._flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # e.g. the bot can't send messages in the channel anymore; nobody awaits this task
+            log.exception("Could not send the S&L output in #{0}".format(self.channel))
+
+    async def _flush(self, file: discord.File = None):
+        # sends the buffered lines now, in a single message with the file if possible
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        lines, self.output = self.output, []
+        messages = []
+        for line in lines:
+            if len(messages) > 0 and len(messages[-1]) + len(line) + 1 <= MESSAGE_MAX_LENGTH:
+                messages[-1] += "\n" + line
+            else:
+                messages.append(line)
+        if file is not None and len(messages) == 0:
+            messages.append(None)
+        for i, content in enumerate(messages):
+            # the file goes with the last message, below everything that led to it
+            await self.channel.send(content, file=file if i == len(messages) - 1 else None)
+            self.messages_sent += 1
 
     async def open_game(self):
         await self._add_player(self.author)
-        await self.channel.send(
-            '**Snakes and Ladders**: A new game is about to start!\nMention me and type **sal join** to participate.',
+        if self.state == 'over':
+            # closed while the avatar of the author was being fetched
+            return
+        self._say(
+            '**Snakes and Ladders**: A new game is about to start!\nMention me and type **sal join** to participate.')
+        await self._flush(
             file=discord.File(os.path.join('res', 'ladders', 'banner.jpg'), filename='Snakes and Ladders.jpg'))
+        if self.state == 'over':
+            # closed while the banner was being sent
+            return
         self.state = 'waiting'
 
     async def _add_player(self, user: discord.Member):
         self.players.append(user)
         self.player_tiles[user.id] = 1
-        avatar_url = user.avatar_url_as(format='jpeg', size=PLAYER_ICON_IMAGE_SIZE)
-        async with aiohttp.ClientSession() as session:
-            async with session.get(avatar_url) as res:
-                avatar_bytes = await res.read()
-                im = Image.open(io.BytesIO(avatar_bytes)).resize((BOARD_PLAYER_SIZE, BOARD_PLAYER_SIZE))
-                self.avatar_images[user.id] = im
+        self.avatar_images[user.id] = await self.snakes.avatars.get(user)
 
     async def player_join(self, user: discord.Member):
+        self._touch()
         for p in self.players:
             if user == p:
-                await self.channel.send(user.mention + " You are already in the game.")
+                self._say(user.mention + " You are already in the game.")
                 return
         if self.state != 'waiting':
-            await self.channel.send(user.mention + " You cannot join at this time.")
+            self._say(user.mention + " You cannot join at this time.")
             return
         if len(self.players) is MAX_PLAYERS:
-            await self.channel.send(user.mention + " The game is full!")
+            self._say(user.mention + " The game is full!")
             return
 
         await self._add_player(user)
 
-        await self.channel.send(
+        self._say(
             "**Snakes and Ladders**: " + user.mention + " has joined the game.\nThere are now " + str(
                 len(self.players)) + " players in the game.")
 
     async def player_leave(self, user: discord.Member):
+        self._touch()
         if user == self.author:
-            await self.channel.send(user.mention + " You are the author, and cannot leave the game. Execute "
-                                                   "`sal cancel` to cancel the game.")
+            self._say(user.mention + " You are the author, and cannot leave the game. Execute "
+                                     "`sal cancel` to cancel the game.")
             return
         for p in self.players:
             if user == p:
                 self.players.remove(p)
                 self.player_tiles.pop(p.id, None)
                 self.round_has_rolled.pop(p.id, None)
-                await self.channel.send("**Snakes and Ladders**: " + user.mention + " has left the game.")
+                self._say("**Snakes and Ladders**: " + user.mention + " has left the game.")
                 if self.state != 'waiting' and len(self.players) == 1:
-                    await self.channel.send("**Snakes and Ladders**: The game has been surrendered!")
+                    self._say("**Snakes and Ladders**: The game has been surrendered!")
                     self._destruct()
+                    await self._flush()
                 return
-        await self.channel.send(user.mention + " You are not in the match.")
+        self._say(user.mention + " You are not in the match.")
 
     async def cancel_game(self, user: discord.Member):
+        self._touch()
         if not user == self.author:
-            await self.channel.send(user.mention + " Only the author of the game can cancel it.")
+            self._say(user.mention + " Only the author of the game can cancel it.")
             return
-        await self.channel.send("**Snakes and Ladders**: Game has been canceled.")
+        self._say("**Snakes and Ladders**: Game has been canceled.")
         self._destruct()
+        await self._flush()
 
     async def start_game(self, user: discord.Member):
+        self._touch()
         if not user == self.author:
-            await self.channel.send(user.mention + " Only the author of the game can start it.")
+            self._say(user.mention + " Only the author of the game can start it.")
             return
         if len(self.players) < 2:
-            await self.channel.send(user.mention + " A minimum of 2 players is required to start the game.")
+            self._say(user.mention + " A minimum of 2 players is required to start the game.")
             return
         if not self.state == 'waiting':
-            await self.channel.send(user.mention + " The game cannot be started at this time.")
+            self._say(user.mention + " The game cannot be started at this time.")
             return
         self.state = 'starting'
         player_list = ', '.join(user.mention for user in self.players)
-        await self.channel.send("**Snakes and Ladders**: The game is starting!\nPlayers: " + player_list)
+        self._say("**Snakes and Ladders**: The game is starting!\nPlayers: " + player_list)
         await self.start_round()
 
     async def start_round(self):
         self.state = 'roll'
         for user in self.players:
             self.round_has_rolled[user.id] = False
-        board_img = Image.open(os.path.join('res', 'ladders', 'board.jpg'))
-        player_row_size = math.ceil(MAX_PLAYERS / 2)
-        for i, player in enumerate(self.players):
-            tile = self.player_tiles[player.id]
-            tile_coordinates = self._board_coordinate_from_index(tile)
-            x_offset = BOARD_MARGIN[0] + tile_coordinates[0] * BOARD_TILE_SIZE
-            y_offset = \
-                BOARD_MARGIN[1] + (
-                    (10 * BOARD_TILE_SIZE) - (9 - tile_coordinates[1]) * BOARD_TILE_SIZE - BOARD_PLAYER_SIZE)
-            x_offset += BOARD_PLAYER_SIZE * (i % player_row_size)
-            y_offset -= BOARD_PLAYER_SIZE * math.floor(i / player_row_size)
-            board_img.paste(self.avatar_images[player.id],
-                            box=(x_offset, y_offset))
-        stream = io.BytesIO()
-        board_img.save(stream, format='JPEG')
-        board_file = discord.File(stream.getvalue(), filename='Board.jpg')
-        await self.channel.send("**Snakes and Ladders**: A new round has started! Current board:", file=board_file)
+        # snapshot of the players, since the game can change while the board is being drawn
+        placements = [(player.id, self.avatar_images[player.id], self.player_tiles[player.id])
+                      for player in self.players]
+        board_bytes = await self.snakes.bot.executor.run(self.board.render, placements, droppable=False)
+        if self.state == 'over':
+            # closed while the board was being drawn
+            return
+        board_file = discord.File(board_bytes, filename='Board.jpg')
         player_list = '\n'.join((user.mention + ": Tile " + str(self.player_tiles[user.id])) for user in self.players)
-        await self.channel.send(
-            "**Current positions**:\n" + player_list + "\n\nMention me with **roll** to roll the dice!")
+        self._say("**Snakes and Ladders**: A new round has started!\n**Current positions**:\n" + player_list
+                  + "\n\nMention me with **roll** to roll the dice!")
+        # the board, the positions and the rolls of the last round, all in one message
+        await self._flush(file=board_file)
 
     async def player_roll(self, user: discord.Member):
+        self._touch()
         if user.id not in self.player_tiles:
-            await self.channel.send(user.mention + " You are not in the match.")
+            self._say(user.mention + " You are not in the match.")
             return
         if self.state != 'roll':
-            await self.channel.send(user.mention + " You may not roll at this time.")
+            self._say(user.mention + " You may not roll at this time.")
             return
         if self.round_has_rolled[user.id]:
-            await self.channel.send(user.mention + " You have already rolled this round, please be patient.")
+            self._say(user.mention + " You have already rolled this round, please be patient.")
             return
         roll = random.randint(1, 6)
-        await self.channel.send(user.mention + " rolled a **{0}**!".format(roll))
         next_tile = self.player_tiles[user.id] + roll
         # apply snakes and ladders
         if next_tile in BOARD:
             target = BOARD[next_tile]
             if target < next_tile:
-                await self.channel.send(user.mention + " slips on a snake and falls back to **{0}**".format(target))
+                self._say(user.mention + " rolled a **{0}**, slips on a snake and falls back to **{1}**".format(
+                    roll, target))
             else:
-                await self.channel.send(user.mention + " climbs a ladder to **{0}**".format(target))
+                self._say(user.mention + " rolled a **{0}** and climbs a ladder to **{1}**".format(roll, target))
             next_tile = target
+        else:
+            self._say(user.mention + " rolled a **{0}**!".format(roll))
 
         self.player_tiles[user.id] = min(100, next_tile)
         self.round_has_rolled[user.id] = True
         winner = self._check_winner()
         if winner is not None:
-            await self.channel.send("**Snakes and Ladders**: " + user.mention + " has won the game! :tada:")
+            self._say("**Snakes and Ladders**: " + user.mention + " has won the game! :tada:")
             self._destruct()
+            await self._flush()
             return
         if self._check_all_rolled():
             await self.start_round()
@@ -163,13 +278,8 @@ class SnakeAndLaddersGame:
         return all(rolled for rolled in self.round_has_rolled.values())
 
     def _destruct(self):
-        del self.snakes.active_sal[self.channel]
-
-    def _board_coordinate_from_index(self, index: int):
-        # converts the tile number to the x/y coordinates for graphical purposes
-        y_level = 9 - math.floor((index - 1) / 10)
-        is_reversed = math.floor((index - 1) / 10) % 2 != 0
-        x_level = (index - 1) % 10
-        if is_reversed:
-            x_level = 9 - x_level
-        return x_level, y_level
+        # stops the command task once the current command is done; a new game may already be in the channel
+        self.state = 'over'
+        self.commands.put_nowait((None, ()))
+        if self.snakes.active_sal.get(self.channel) is self:
+            del self.snakes.active_sal[self.channel]
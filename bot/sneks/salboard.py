@@ -0,0 +1,132 @@
+import io
+import math
+import os
+from functools import lru_cache
+from typing import Dict, Hashable, List, Tuple
+
+from PIL import Image
+
+from res.ladders.board import BOARD_MARGIN, BOARD_PLAYER_SIZE, BOARD_TILE_SIZE, MAX_PLAYERS
+
+BOARD_FILE = os.path.join('res', 'ladders', 'board.jpg')
+PLAYER_ROW_SIZE = math.ceil(MAX_PLAYERS / 2)
+
+# a player on the board: (key, avatar, tile), where the key identifies the avatar (e.g. the user id)
+Placement = Tuple[Hashable, Image.Image, int]
+Box = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=None)
+def base_board(path: str = BOARD_FILE) -> Image.Image:
+    """
+    Decodes the empty board, once per process. The image is shared by all the games and must not be modified.
+    :param path: the path of the board image
+    :return: the decoded board
+    """
+    board = Image.open(path)
+    board.load()
+    return board
+
+
+def board_coordinate_from_index(index: int) -> Tuple[int, int]:
+    """
+    Converts a tile number to its x/y coordinates on the board grid
+    :param index: the tile number, 1 to 100
+    :return: (x, y), where (0, 0) is the top left tile
+    """
+    y_level = 9 - math.floor((index - 1) / 10)
+    is_reversed = math.floor((index - 1) / 10) % 2 != 0
+    x_level = (index - 1) % 10
+    if is_reversed:
+        x_level = 9 - x_level
+    return x_level, y_level
+
+
+def _tile_position(index: int) -> Tuple[int, int]:
+    # pixel position of the first player slot of a tile
+    x, y = board_coordinate_from_index(index)
+    x_offset = BOARD_MARGIN[0] + x * BOARD_TILE_SIZE
+    y_offset = BOARD_MARGIN[1] + ((10 * BOARD_TILE_SIZE) - (9 - y) * BOARD_TILE_SIZE - BOARD_PLAYER_SIZE)
+    return x_offset, y_offset
+
+
+# pixel position of the first player slot of every tile, by tile number
+TILE_POSITIONS = {index: _tile_position(index) for index in range(1, 101)}
+
+
+def player_box(slot: int, tile: int) -> Box:
+    """
+    :param slot: the index of the player in the game
+    :param tile: the tile the player is on
+    :return: the (left, top, right, bottom) pixel box of the player's avatar on the board
+    """
+    x_offset, y_offset = TILE_POSITIONS[tile]
+    x_offset += BOARD_PLAYER_SIZE * (slot % PLAYER_ROW_SIZE)
+    y_offset -= BOARD_PLAYER_SIZE * (slot // PLAYER_ROW_SIZE)
+    return x_offset, y_offset, x_offset + BOARD_PLAYER_SIZE, y_offset + BOARD_PLAYER_SIZE
+
+
+def _intersects(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class BoardCanvas:
+    """
+    The board of a single game, drawn incrementally.
+
+    The canvas keeps the players drawn in the previous round; rendering only restores the regions of the players
+    that moved (or left) from the base board, and pastes their avatars again. Rendering is blocking, and must not
+    run for the same canvas in two threads at once.
+    """
+
+    def __init__(self, path: str = BOARD_FILE):
+        self.base = base_board(path)
+        self.canvas: Image.Image = None
+        # what is drawn in each player slot: (key, tile, box)
+        self.drawn: Dict[int, Tuple[Hashable, int, Box]] = {}
+        self.image: bytes = None
+
+    @property
+    def size_bytes(self) -> int:
+        """
+        :return: how much memory the canvas and the last rendered image take, in bytes (not the shared base board)
+        """
+        size = 0
+        if self.canvas is not None:
+            size += self.canvas.width * self.canvas.height * len(self.canvas.getbands())
+        if self.image is not None:
+            size += len(self.image)
+        return size
+
+    def render(self, placements: List[Placement]) -> bytes:
+        """
+        Draws the players on the board
+        :param placements: the players, in slot order
+        :return: the binary data of the JPEG image
+        """
+        if self.canvas is None:
+            self.canvas = self.base.copy()
+        wanted = {slot: (key, tile) for slot, (key, _, tile) in enumerate(placements)}
+        stale = [slot for slot, (key, tile, _) in self.drawn.items() if wanted.get(slot) != (key, tile)]
+        moved = [slot for slot in wanted if slot in stale or slot not in self.drawn]
+        if not stale and not moved and self.image is not None:
+            return self.image
+
+        # restore the background of the players that moved, then draw them at their new place
+        restored = [self.drawn.pop(slot)[2] for slot in stale]
+        for box in restored:
+            self.canvas.paste(self.base.crop(box), box=box)
+        # other players can overlap a restored region when a board packs its tiles tightly
+        for slot, (_, _, box) in self.drawn.items():
+            if any(_intersects(box, other) for other in restored):
+                moved.append(slot)
+        for slot in sorted(moved):
+            key, avatar, tile = placements[slot]
+            box = player_box(slot, tile)
+            self.canvas.paste(avatar, box=box[:2])
+            self.drawn[slot] = (key, tile, box)
+
+        stream = io.BytesIO()
+        self.canvas.save(stream, format='JPEG')
+        self.image = stream.getvalue()
+        return self.image
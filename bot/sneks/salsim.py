@@ -0,0 +1,210 @@
+# Snakes and Ladders board analytics: batched Monte Carlo simulation, and an exact Markov chain solver as a cross-check
+# boards are checked from the project directory with:
+#     pipenv run python -m bot.sneks.salsim [--board path/to/board.py] [--games N]
+
+import argparse
+import runpy
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from res.ladders.board import BOARD, MAX_PLAYERS
+
+LAST_TILE = 100
+DIE_SIDES = 6
+ROLLS_PER_STEP = 3  # rolls simulated at once: the 6 ** 3 possible sequences fit in a byte
+SIMULATED_GAMES = 250000  # per player count (the same 1,000,000 simulated players are seated in every game size)
+
+
+class BoardStats(NamedTuple):
+    """
+    The results of simulating a board
+    """
+    games: int
+    expected_turns: float  # exact, for a single player
+    solo_turns: np.ndarray  # turns taken by every simulated player to finish, on their own
+    hits: Dict[int, float]  # exact average times each snake/ladder is taken by a player in a game, by start tile
+    rounds: Dict[int, np.ndarray]  # rounds played in every game, by player count
+    photo_finishes: Dict[int, float]  # share of the games decided by who rolled first in the last round, by players
+
+
+def jump_table(board: Dict[int, int]) -> np.ndarray:
+    """
+    Precomputes where a player ends up from any tile they can land on, snakes and ladders included
+    (rolling past the last tile wins, like in the game)
+    :param board: the snakes and ladders of the board, as {from: to}
+    :return: the destination of every tile from 0 to LAST_TILE + DIE_SIDES
+    """
+    tiles = np.arange(LAST_TILE + DIE_SIDES + 1)
+    for start, end in board.items():
+        tiles[start] = end
+    return np.minimum(tiles, LAST_TILE)
+
+
+def step_table(board: Dict[int, int]):
+    """
+    Precomputes where a player ends up after ROLLS_PER_STEP rolls, from any tile and for any sequence of rolls
+    :param board: the snakes and ladders of the board, as {from: to}
+    :return: (the destination, the turns taken), both indexed by tile * 6 ** ROLLS_PER_STEP + sequence of rolls
+    (a player who reaches the last tile stops there, and takes no more turns)
+    """
+    jumps = jump_table(board)
+    sequences = np.arange(DIE_SIDES ** ROLLS_PER_STEP)
+    positions = np.repeat(np.arange(LAST_TILE + 1)[:, None], len(sequences), axis=1)
+    turns = np.zeros_like(positions)
+    for i in range(ROLLS_PER_STEP):
+        rolls = sequences // DIE_SIDES ** i % DIE_SIDES + 1
+        playing = positions != LAST_TILE
+        positions = np.where(playing, jumps[positions + rolls], positions)
+        turns += playing
+    return positions.ravel(), turns.ravel()
+
+
+def simulate_turns(board: Dict[int, int], players: int, rng: np.random.RandomState) -> np.ndarray:
+    """
+    Simulates players going from the first to the last tile on their own, all at once
+    :param board: the snakes and ladders of the board, as {from: to}
+    :param players: how many players to simulate
+    :param rng: the random generator
+    :return: the turns taken by every player
+    """
+    destinations, step_turns = step_table(board)
+    sequences = DIE_SIDES ** ROLLS_PER_STEP
+    turns = np.zeros(players, dtype=np.int64)
+    # the players still playing, shrinking as they finish
+    playing = np.arange(players)
+    positions = np.ones(players, dtype=np.int64)
+    taken = np.zeros(players, dtype=np.int64)
+    while len(playing) > 0:
+        steps = positions * sequences + rng.randint(0, sequences, size=len(playing), dtype=np.uint8)
+        positions = destinations[steps]
+        taken += step_turns[steps]
+        finished = positions == LAST_TILE
+        turns[playing[finished]] = taken[finished]
+        playing, positions, taken = playing[~finished], positions[~finished], taken[~finished]
+    return turns
+
+
+def _transitions(board: Dict[int, int]) -> np.ndarray:
+    # transition probabilities between the tiles before the last one (tile t is state t - 1)
+    jumps = jump_table(board)
+    transitions = np.zeros((LAST_TILE - 1, LAST_TILE - 1))
+    for tile in range(1, LAST_TILE):
+        for roll in range(1, DIE_SIDES + 1):
+            destination = jumps[tile + roll]
+            if destination != LAST_TILE:
+                transitions[tile - 1, destination - 1] += 1 / DIE_SIDES
+    return transitions
+
+
+def expected_turns(board: Dict[int, int]) -> float:
+    """
+    Solves the board as an absorbing Markov chain
+    :param board: the snakes and ladders of the board, as {from: to}
+    :return: the exact expected amount of turns for a single player to finish
+    """
+    # expected turns from every tile: t = 1 + Q.t
+    transitions = _transitions(board)
+    turns = np.linalg.solve(np.eye(LAST_TILE - 1) - transitions, np.ones(LAST_TILE - 1))
+    return float(turns[0])
+
+
+def expected_hits(board: Dict[int, int]) -> Dict[int, float]:
+    """
+    Solves how often each snake and ladder is taken, from the expected visits of the absorbing Markov chain
+    :param board: the snakes and ladders of the board, as {from: to}
+    :return: the exact expected times a single player takes each snake/ladder in a game, by start tile
+    """
+    # expected turns started on every tile, from the first tile: the first row of (I - Q)^-1
+    transitions = _transitions(board)
+    start = np.zeros(LAST_TILE - 1)
+    start[0] = 1
+    visits = np.linalg.solve((np.eye(LAST_TILE - 1) - transitions).T, start)
+    hits = {tile: 0.0 for tile in sorted(board)}
+    for tile in range(1, LAST_TILE):
+        for roll in range(1, DIE_SIDES + 1):
+            if tile + roll in hits:
+                hits[tile + roll] += visits[tile - 1] / DIE_SIDES
+    return hits
+
+
+def board_stats(board: Dict[int, int] = BOARD, games: int = SIMULATED_GAMES, max_players: int = MAX_PLAYERS,
+                seed: int = None) -> BoardStats:
+    """
+    Simulates games on a board (blocking)
+    :param board: the snakes and ladders of the board, as {from: to}
+    :param games: how many games to simulate, for each player count
+    :param max_players: the maximum amount of players in a game
+    :param seed: the seed of the simulation, or None for a random one
+    :return: the stats of the board
+    """
+    rng = np.random.RandomState(seed)
+    # players don't interact, so a game is as long as its fastest player, and the same simulated players can be
+    # seated in games of any size. Everyone rolls each round, in no set order: when several players would finish
+    # in the last round, the first of them to roll wins, so no seat has an edge.
+    solo_turns = simulate_turns(board, games * max_players, rng)
+    seated = solo_turns.reshape(games, max_players)
+    rounds = {}
+    photo_finishes = {}
+    for players in range(2, max_players + 1):
+        table = seated[:, :players]
+        rounds[players] = table.min(axis=1)
+        finishers = (table == rounds[players][:, None]).sum(axis=1)
+        photo_finishes[players] = float((finishers > 1).mean())
+    return BoardStats(
+        games=games,
+        expected_turns=expected_turns(board),
+        solo_turns=solo_turns,
+        hits=expected_hits(board),
+        rounds=rounds,
+        photo_finishes=photo_finishes
+    )
+
+
+def _distribution(values: np.ndarray) -> str:
+    p10, p50, p90, p99 = np.percentile(values, [10, 50, 90, 99])
+    return "mean {0:5.1f}, p10 {1:3.0f}, median {2:3.0f}, p90 {3:3.0f}, p99 {4:3.0f}, max {5}".format(
+        values.mean(), p10, p50, p90, p99, values.max())
+
+
+def format_stats(stats: BoardStats, board: Dict[int, int] = BOARD) -> str:
+    """
+    :param stats: the stats of the board
+    :param board: the snakes and ladders of the board, as {from: to}
+    :return: a human-readable report of the stats
+    """
+    lines = [
+        "{0:,} simulated games per player count ({1:,} players)".format(stats.games, len(stats.solo_turns)),
+        "Turns alone: {0} (exact mean {1:.2f})".format(_distribution(stats.solo_turns), stats.expected_turns)
+    ]
+    for players, rounds in stats.rounds.items():
+        lines.append("{0} players: {1} rounds, {2:.1%} decided by who rolled first".format(
+            players, _distribution(rounds), stats.photo_finishes[players]))
+    lines.append("Hits per player per game (exact):")
+    ladders = ["{0}->{1} {2:.2f}".format(start, board[start], hits) for start, hits in stats.hits.items()
+               if board[start] > start]
+    snakes = ["{0}->{1} {2:.2f}".format(start, board[start], hits) for start, hits in stats.hits.items()
+              if board[start] < start]
+    lines.append("  ladders: " + ", ".join(ladders))
+    lines.append("  snakes:  " + ", ".join(snakes))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates games on a Snakes and Ladders board.")
+    parser.add_argument('--board', help="a Python file defining BOARD (and optionally MAX_PLAYERS), "
+                                        "defaults to the board of the bot")
+    parser.add_argument('--games', type=int, default=SIMULATED_GAMES, help="games to simulate per player count")
+    parser.add_argument('--seed', type=int, help="the seed of the simulation")
+    args = parser.parse_args()
+
+    board, max_players = BOARD, MAX_PLAYERS
+    if args.board is not None:
+        definitions = runpy.run_path(args.board)
+        board, max_players = definitions['BOARD'], definitions.get('MAX_PLAYERS', MAX_PLAYERS)
+    stats = board_stats(board, args.games, max_players, args.seed)
+    print(format_stats(stats, board))
+
+
+if __name__ == '__main__':
+    main()
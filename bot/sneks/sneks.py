@@ -1,21 +1,18 @@
+import asyncio
 import json
 import logging
 import random
+from typing import List
 from urllib import parse
 
 import aiohttp
 
-from bs4 import BeautifulSoup
-
 import discord
 
-import requests
+from bot.constants import HTTP_READ_TIMEOUT
+from bot.sneks import itis
+from bot.sneks.itis import ITIS_TSN_URL, TaxonRecord
 
-# the search URL for the ITIS database
-ITIS_BASE_URL = "https://itis.gov/servlet/SingleRpt/{0}"
-ITIS_SEARCH_URL = ITIS_BASE_URL.format("SingleRpt")
-ITIS_JSON_SERVICE_FULLRECORD = "https://itis.gov/ITISWebService/jsonservice/getFullRecordFromTSN?tsn={0}"
-ITIS_JSON_SERVICE_FULLHIERARCHY = "https://itis.gov/ITISWebService/jsonservice/getFullHierarchyFromTSN?tsn={0}"
 WIKI_API_URL = "http://en.wikipedia.org/w/api.php?{0}"
 WIKI_URL = "http://en.wikipedia.org/wiki/{0}"
 IMAGE_SEARCH_URL = "https://api.qwant.com/api/search/images?count=1&offset=1&q={0}+snake"
@@ -31,6 +28,12 @@ class Embeddable:
     def as_embed(self) -> discord.Embed:
         raise NotImplementedError()
 
+    def names(self) -> List[str]:
+        """
+        :return: the names the snek is known by on ITIS (scientific and common), to be suggested for typos
+        """
+        return []
+
 
 class SnakeDef(Embeddable):
     """
@@ -67,6 +70,12 @@ class SnakeDef(Embeddable):
             embed.add_field(name="Geography", value=self.geo)
         return embed
 
+    def names(self):
+        if self.genus == "":
+            # found on Wikipedia only, named after whatever was searched
+            return []
+        return [self.species] + _split_common_names(self.common_name)
+
 
 class SnakeGroup(Embeddable):
 
@@ -98,38 +107,31 @@ class SnakeGroup(Embeddable):
             embed.add_field(name="Geography", value=self.geo)
         return embed
 
+    def names(self):
+        return [self.scientific_name] + _split_common_names(self.common_name)
+
+
+def _split_common_names(common_name: str) -> List[str]:
+    # the common names of an ITIS record, as joined by build_embeddable
+    if common_name is None or common_name == "None":
+        return []
+    return [name for name in common_name.split(', ') if name != ""]
+
 
-def find_image_url(name: str) -> str:
+async def find_image_url(session: aiohttp.ClientSession, name: str) -> str:
     """
     Searches an image on the Qwant search engine API
+    :param session: the aiohttp HTTP session
     :param name: the name of the image
     :return: a direct URL to the image, or an empty string if the search was unsuccessful
     """
     req_url = IMAGE_SEARCH_URL.format(name.replace(" ", "+"))
-    res = requests.get(url=req_url, headers={"User-Agent": "Mozilla/5.0"})
-    if res.status_code != 200:
-        return ""
-    j = json.JSONDecoder().decode(res.content.decode("utf-8"))
-    image_url = j['data']['result']['items'][0]['media']
-    return image_url
-
-
-def is_itis_table_empty(soup) -> bool:
-    """
-    Checks whether an ITIS search result table is empty
-    :param soup: the soup to search in
-    :return: true if the search table is empty
-    """
-    return "No Records Found." in str(soup)
-
-
-def itis_find_link(soup) -> str:
-    """
-    Finds the first link in an ITIS search result table
-    :param soup: the soup to search in
-    :return: a direct URL
-    """
-    return ITIS_BASE_URL.format(soup.find("a")['href'])
+    async with session.get(req_url, headers={"User-Agent": "Mozilla/5.0"}, timeout=HTTP_READ_TIMEOUT) as res:
+        if res.status != 200:
+            return ""
+        j = json.JSONDecoder().decode(await res.text(encoding="utf-8"))
+        image_url = j['data']['result']['items'][0]['media']
+        return image_url
 
 
 async def wiki_summary(session: aiohttp.ClientSession, name: str, deepcat: str) -> str:
@@ -148,7 +150,7 @@ async def wiki_summary(session: aiohttp.ClientSession, name: str, deepcat: str)
         'format': 'json',
         'action': 'query'
     }))
-    async with session.get(search_url) as res:
+    async with session.get(search_url, timeout=HTTP_READ_TIMEOUT) as res:
         j = await res.json()
         log.debug(search_url)
         if len(j['query']['search']) is 0:
@@ -163,125 +165,149 @@ async def wiki_summary(session: aiohttp.ClientSession, name: str, deepcat: str)
             'format': 'json',
             'action': 'query'
         }))
-        async with session.get(page_url) as page_res:
+        async with session.get(page_url, timeout=HTTP_READ_TIMEOUT) as page_res:
             page_json = await page_res.json()
             return page_json['query']['pages'][page_id]['extract']
 
 
-async def scrape_itis_page(url: str, initial_query: str) -> Embeddable:
+async def optional(coro, default, description: str):
+    """
+    Awaits a non-essential upstream call, falling back to a default value if it fails or times out
+    :param coro: the coroutine to await
+    :param default: the value to return if the call fails
+    :param description: what the call is fetching, for logging
+    :return: the result of the coroutine, or the default value
+    """
+    try:
+        return await coro
+    except (asyncio.TimeoutError, aiohttp.ClientError, KeyError, IndexError, ValueError) as e:
+        log.warning("Could not fetch {0}: {1!r}".format(description, e))
+        return default
+
+
+async def build_embeddable(session: aiohttp.ClientSession, record: TaxonRecord, url: str,
+                           initial_query: str) -> Embeddable:
+    """
+    Builds a snek from an ITIS record, fetching its image and Wikipedia summary concurrently.
+    Both are optional: if they fail, the snek is returned without them.
+    :param session: the aiohttp HTTP session
+    :param record: the ITIS record of the snek
+    :param url: the URL of the ITIS page
+    :param initial_query: the initial query submitted in the search
+    :return: an Embeddable object to be output
+    """
+    scientific_name = record.scientific_name
+    image_url, summary = await asyncio.gather(
+        optional(find_image_url(session, scientific_name), "", "image of " + scientific_name),
+        optional(wiki_summary(session, scientific_name + " " + initial_query, deepcat='Snake_genera'), None,
+                 "summary of " + scientific_name)
+    )
+
+    common_name = ', '.join(record.common_names)
+    if record.rank == "Species":
+        embeddable = SnakeDef()
+        embeddable.common_name = common_name if common_name != "" else "None"
+        embeddable.species = record.combined_name
+        embeddable.genus = record.parent_name
+        embeddable.family = record.family
+        embeddable.wiki_link = url
+    else:
+        embeddable = SnakeGroup()
+        embeddable.common_name = common_name if common_name != "" else "None"
+        embeddable.scientific_name = scientific_name
+        embeddable.link = url
+        embeddable.rank = record.rank
+    embeddable.image_url = image_url
+    embeddable.short_description = summary if summary is not None else ""
+    embeddable.geo = ', '.join(record.geo)
+    return embeddable
+
+
+async def scrape_itis_page(session: aiohttp.ClientSession, url: str, initial_query: str) -> Embeddable:
     """
     Scrapes an ITIS page from the direct URL
+
+    The full record and the hierarchy only depend on the TSN, so they are fetched concurrently. The family is
+    optional: if the hierarchy can't be fetched, it is left as "Unknown".
+    :param session: the aiohttp HTTP session
     :param url: the URL of the ITIS page
     :param initial_query: the initial query submitted in the search
     :return: an Embeddable object to be output
     """
     tsn = parse.parse_qs(parse.urlparse(url).query)['search_value'][0]
-    json_url = ITIS_JSON_SERVICE_FULLRECORD.format(tsn)
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(json_url) as res:
-            j = await res.text(encoding='iso-8859-1')
-            data = json.JSONDecoder().decode(j)
-            common_names = []
-            for common_name_tag in data['commonNameList']['commonNames']:
-                if common_name_tag is None:
-                    continue
-                if common_name_tag['language'] == "English":
-                    common_names.append(common_name_tag['commonName'])
-            common_name = ', '.join(common_names)
-            rank = data['hierarchyUp']['rankName']
-            scientific_name = data['hierarchyUp']['taxonName']
-            geo = []
-            for geoDivisions in data['geographicDivisionList']['geoDivisions']:
-                if geoDivisions is not None:
-                    geo.append(geoDivisions['geographicValue'])
-            if rank == "Species":
-                embeddable = SnakeDef()
-                embeddable.common_name = common_name if common_name != "" else "None"
-                embeddable.species = data['scientificName']['combinedName']
-                embeddable.genus = data['hierarchyUp']['parentName']
-
-                async with session.get(ITIS_JSON_SERVICE_FULLHIERARCHY.format(tsn)) as hierarchy_res:
-                    hier_j = await hierarchy_res.text(encoding='iso-8859-1')
-                    hier_data = json.JSONDecoder().decode(hier_j)
-                    family = "Unknown"
-                    for hier in hier_data['hierarchyList']:
-                        if hier['rankName'] == 'Family':
-                            family = hier['taxonName']
-                    embeddable.family = family
-
-                embeddable.image_url = find_image_url(scientific_name)
-                embeddable.wiki_link = url
-                summary = await wiki_summary(session, scientific_name + " " + initial_query, deepcat='Snake_genera')
-                embeddable.short_description = summary if not None else ""
-                embeddable.geo = ', '.join(geo)
-            else:
-                embeddable = SnakeGroup()
-                summary = await wiki_summary(session, scientific_name + " " + initial_query, deepcat='Snake_genera')
-                embeddable.short_description = summary if not None else ""
-                embeddable.common_name = common_name if common_name != "" else "None"
-                embeddable.scientific_name = scientific_name
-                embeddable.link = url
-                embeddable.image_url = find_image_url(scientific_name)
-                embeddable.rank = rank
-                embeddable.geo = ', '.join(geo)
-            return embeddable
-
-
-async def scrape_itis(name: str) -> Embeddable:
+
+    data, family = await asyncio.gather(
+        itis.full_record(session, tsn),
+        optional(itis.family(session, tsn), "Unknown", "hierarchy of TSN " + tsn)
+    )
+    return await build_embeddable(session, itis.parse_full_record(data, family), url, initial_query)
+
+
+async def wiki_fallback_summary(session: aiohttp.ClientSession, name: str) -> str:
+    """
+    Finds the Wikipedia summary of a snek that is not on ITIS
+    :param session: the aiohttp HTTP session
+    :param name: the name of the snek
+    :return: the summary, or None if no article was found
+    """
+    summary = await wiki_summary(session, name, deepcat='Snakes_by_common_name')
+    if summary is None:
+        summary = await wiki_summary(session, name, deepcat='Snake_genera')
+    return summary
+
+
+async def scrape_wikipedia(session: aiohttp.ClientSession, name: str) -> Embeddable:
+    """
+    Builds a snek from Wikipedia alone, for sneks that are not on ITIS
+    :param session: the aiohttp HTTP session
+    :param name: the name of the snek
+    :return: an Embeddable object to be output, or None if Wikipedia doesn't know the snek either
+    """
+    # the image is fetched at the same time, in case there is a summary
+    summary, image_url = await asyncio.gather(
+        wiki_fallback_summary(session, name),
+        optional(find_image_url(session, name), "", "image of " + name)
+    )
+    if summary is None:
+        return None
+    snake = SnakeDef()
+    snake.short_description = summary
+    snake.species = name.capitalize()
+    snake.common_name = snake.species
+    snake.wiki_link = WIKI_URL.format(name.capitalize()).replace(' ', '_')
+    snake.image_url = image_url
+    return snake
+
+
+async def scrape_itis(session: aiohttp.ClientSession, name: str, mirror=None) -> Embeddable:
     """
     Searches and scrapes the ITIS database from the given animal name
+    :param session: the aiohttp HTTP session
     :param name: the name of the animal
+    :param mirror: (optional) a local :class:`bot.sneks.mirror.ItisMirror` to answer from instead of ITIS
     :return: an Embeddable object to be output
     """
-    form_data = {
-        'categories': 'All',
-        'Go': 'Search',
-        'search_credRating': 'All',
-        'search_kingdom': 'Animal',
-        'search_span': 'exactly_for',
-        'search_topic': 'all',
-        'search_value': name,
-        'source': 'html'
-    }
-    res = requests.post(url=ITIS_SEARCH_URL, data=form_data)
-    html = res.content.decode('iso-8859-1')
-    if "No Records Found?" in html:
-        async with aiohttp.ClientSession() as session:
-            # no snek, maybe wikipedia?
-            snake = SnakeDef()
-            snake.short_description = await wiki_summary(session, name, deepcat='Snakes_by_common_name')
-            if snake.short_description is None:
-                snake.short_description = await wiki_summary(session, name, deepcat='Snake_genera')
-                if snake.short_description is None:
-                    return None
-            snake.species = name.capitalize()
-            snake.common_name = snake.species
-            snake.wiki_link = WIKI_URL.format(name.capitalize()).replace(' ', '_')
-            snake.image_url = find_image_url(name)
-            return snake
-    soup = BeautifulSoup(html, "html.parser")
-
-    tables = soup.find_all("table", {"width": "100%"})
-    table_common_name = tables[1]
-    table_scientific = tables[2]
-
-    is_common_name = not is_itis_table_empty(table_common_name)
-    is_scientific = not is_itis_table_empty(table_scientific)
-
-    if not is_common_name and not is_scientific:
-        # unknown snek, abort
-        return None
+    if mirror is not None:
+        tsn = mirror.find_tsn(name)
+        if tsn is None:
+            # the mirror has every snek on ITIS, no need to search it again
+            return await scrape_wikipedia(session, name)
+        return await build_embeddable(session, mirror.record(tsn), ITIS_TSN_URL.format(tsn), name)
+
+    tsn = await itis.find_tsn(session, name)
+    if tsn is None:
+        # no snek, maybe wikipedia?
+        return await scrape_wikipedia(session, name)
+    return await scrape_itis_page(session, ITIS_TSN_URL.format(tsn), name)
 
-    url = None
-    if is_scientific:
-        url = itis_find_link(table_scientific)
-    elif is_common_name:
-        url = itis_find_link(table_common_name)
-    if url is None:
-        return None
 
-    return await scrape_itis_page(url, name)
+def normalize_name(name: str) -> str:
+    """
+    Normalizes a snek name so that equivalent queries share the same key
+    :param name: the name of the snek
+    :return: the name in lowercase, with collapsed whitespace
+    """
+    return ' '.join(name.lower().split())
 
 
 def snakify(s):
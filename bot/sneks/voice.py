@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from typing import Callable, Dict
+
+import discord
+
+# voice playback defaults
+VOICE_IDLE_TIMEOUT = 60  # seconds without anything to play before leaving the voice channel
+VOICE_QUEUE_SIZE = 10  # clips waiting to be played, per guild
+VOICE_CONNECT_TIMEOUT = 10  # seconds
+
+log = logging.getLogger(__name__)
+
+
+class VoiceQueueFull(Exception):
+    """
+    Raised when too many clips are already waiting to be played in a guild
+    """
+
+
+class _VoiceSession:
+    # the voice connection of a guild, and the clips waiting to be played on it
+    def __init__(self, guild: discord.Guild, queue_size: int, previous: asyncio.Task = None):
+        self.guild = guild
+        self.requests = asyncio.Queue(maxsize=queue_size)
+        self.voice_client: discord.VoiceClient = None
+        self.task: asyncio.Task = None
+        # the previous session of the guild leaving its voice channel, to wait for before connecting again
+        self.previous = previous
+
+
+class VoiceSessions:
+    """
+    Plays audio clips in voice channels, one at a time per guild.
+
+    Each guild has a session that stays connected between clips, and only leaves the voice channel once nothing
+    was played for ``idle_timeout`` seconds: a burst of clips costs a single voice handshake. A clip for another
+    channel of the same guild moves the connection there, in order. A clip queued while a session is leaving is
+    played by a new session, once the old one has disconnected.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, idle_timeout: float = VOICE_IDLE_TIMEOUT,
+                 queue_size: int = VOICE_QUEUE_SIZE):
+        self.loop = loop
+        self.idle_timeout = idle_timeout
+        self.queue_size = queue_size
+        self.sessions: Dict[int, _VoiceSession] = {}
+        # the disconnections of the sessions that ended, by guild id
+        self.disconnections: Dict[int, asyncio.Task] = {}
+        self.connects = 0
+        self.played = 0
+        self.failures = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    @property
+    def queued(self) -> int:
+        return sum(session.requests.qsize() for session in self.sessions.values())
+
+    def play(self, channel: discord.VoiceChannel, source_factory: Callable[[], discord.AudioSource]):
+        """
+        Queues a clip, played after the clips already queued in the guild
+        :param channel: the voice channel to play it in
+        :param source_factory: creates the audio source, when the clip is about to be played (e.g. so ffmpeg
+        doesn't start before it is needed)
+        :raise VoiceQueueFull: if too many clips are already waiting in the guild
+        """
+        session = self.sessions.get(channel.guild.id)
+        if session is None:
+            session = self.sessions[channel.guild.id] = _VoiceSession(
+                channel.guild, self.queue_size, previous=self.disconnections.get(channel.guild.id))
+            session.task = self.loop.create_task(self._run(session))
+        try:
+            session.requests.put_nowait((channel, source_factory))
+        except asyncio.QueueFull:
+            raise VoiceQueueFull("{0} clips are already waiting".format(session.requests.qsize()))
+
+    async def _run(self, session: _VoiceSession):
+        try:
+            if session.previous is not None:
+                # doesn't raise if the disconnection failed
+                await asyncio.wait([session.previous])
+            # e.g. still connected after a cog reload
+            session.voice_client = session.guild.voice_client
+            while True:
+                try:
+                    channel, source_factory = await asyncio.wait_for(session.requests.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # nothing left to play
+                    return
+                try:
+                    await self._play(session, channel, source_factory)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self.failures += 1
+                    log.exception("Could not play a clip in {0}".format(channel))
+        finally:
+            # a clip queued from now on starts a new session, which waits for this one to disconnect
+            guild_id = session.guild.id
+            if self.sessions.get(guild_id) is session:
+                del self.sessions[guild_id]
+            if session.voice_client is not None and session.voice_client.is_connected():
+                disconnection = self.loop.create_task(session.voice_client.disconnect())
+                self.disconnections[guild_id] = disconnection
+                disconnection.add_done_callback(lambda _: self._disconnected(guild_id, disconnection))
+                # shielded: the disconnection goes on even if this session is cancelled
+                await asyncio.shield(disconnection)
+
+    def _disconnected(self, guild_id: int, disconnection: asyncio.Task):
+        if self.disconnections.get(guild_id) is disconnection:
+            del self.disconnections[guild_id]
+        if not disconnection.cancelled() and disconnection.exception() is not None:
+            log.error("Could not leave the voice channel: {0}".format(disconnection.exception()))
+
+    async def _play(self, session: _VoiceSession, channel: discord.VoiceChannel,
+                    source_factory: Callable[[], discord.AudioSource]):
+        voice_client = session.voice_client
+        if voice_client is None or not voice_client.is_connected():
+            session.voice_client = await channel.connect(timeout=VOICE_CONNECT_TIMEOUT)
+            self.connects += 1
+        elif voice_client.channel != channel:
+            await voice_client.move_to(channel)
+
+        finished = self.loop.create_future()
+
+        def after(error: Exception):
+            # called from the audio thread
+            self.loop.call_soon_threadsafe(_set_result, finished, error)
+
+        session.voice_client.play(source_factory(), after=after)
+        error = await finished
+        if error is not None:
+            self.failures += 1
+            log.error("Playback failed in {0}: {1}".format(channel, error))
+        else:
+            self.played += 1
+
+    def close(self):
+        """
+        Stops playing everywhere, and leaves the voice channels
+        """
+        for session in list(self.sessions.values()):
+            session.task.cancel()
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
@@ -1,4 +1,14 @@
 # coding=utf-8
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+# how long a pool refill worker waits after failures: doubling from the first delay, up to the maximum (seconds)
+REFILL_BACKOFF_FIRST = 1.0
+REFILL_BACKOFF_MAX = 5 * 60
+
+log = logging.getLogger(__name__)
 
 
 class CaseInsensitiveDict(dict):
@@ -45,3 +55,158 @@ class CaseInsensitiveDict(dict):
         for k in list(self.keys()):
             v = super(CaseInsensitiveDict, self).pop(k)
             self.__setitem__(k, v)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key, so that only one of them does the actual work.
+
+    The first caller for a key starts the call; everyone else asking for the same key while it is running
+    awaits the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        """
+        Runs the coroutine returned by ``coro_factory``, unless a call with the same key is already running
+        :param key: the key identifying the call
+        :param coro_factory: a callable returning the coroutine to run
+        :return: the result of the (shared) call
+        """
+        self.calls += 1
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(coro_factory())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # shielded, so a caller giving up doesn't cancel the call for everyone else
+        return await asyncio.shield(future)
+
+
+class WarmPool:
+    """
+    Keeps a bounded pool of ready-made values, refilled in the background as they are taken.
+
+    ``factory`` is a coroutine function producing a new value (or None if it failed). Up to ``concurrency`` values
+    are produced at the same time, and each refill worker waits ``refill_delay`` seconds between two values.
+    After consecutive failures (e.g. an unreachable upstream), a worker backs off exponentially, up to
+    ``max_backoff`` seconds, until a value is produced again.
+    """
+
+    def __init__(self, factory, size: int, concurrency: int = 1, refill_delay: float = 0.0,
+                 max_backoff: float = REFILL_BACKOFF_MAX):
+        self.factory = factory
+        self.size = size
+        self.concurrency = concurrency
+        self.refill_delay = refill_delay
+        self.max_backoff = max_backoff
+        self.queue = asyncio.Queue(maxsize=max(size, 1))
+        self.tasks = []
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.failures = 0
+        self.refill_time = 0.0
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """
+        Starts filling the pool in the background (does nothing if the pool size is 0)
+        :param loop: the event loop to run the refill workers on
+        """
+        if self.size > 0:
+            self.tasks = [loop.create_task(self._refill()) for _ in range(self.concurrency)]
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def take(self):
+        """
+        Takes a ready value from the pool, without waiting
+        :return: the value, or None if the pool is empty
+        """
+        try:
+            value = self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    @property
+    def average_refill_time(self) -> float:
+        return self.refill_time / self.refills if self.refills > 0 else 0.0
+
+    def _backoff(self, failures: int) -> float:
+        # seconds to wait after that many consecutive failures
+        first = max(self.refill_delay, REFILL_BACKOFF_FIRST)
+        return min(first * 2 ** min(failures - 1, 32), max(self.max_backoff, self.refill_delay))
+
+    async def _refill(self):
+        failures = 0
+        while True:
+            start = time.monotonic()
+            try:
+                value = await self.factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Could not refill pool: {0!r}".format(e))
+                value = None
+            if value is None:
+                self.failures += 1
+                failures += 1
+                await asyncio.sleep(self._backoff(failures))
+                continue
+            failures = 0
+            self.refills += 1
+            self.refill_time += time.monotonic() - start
+            # waits here while the pool is full
+            await self.queue.put(value)
+            await asyncio.sleep(self.refill_delay)
+
+
+class LRUCache:
+    """
+    In-memory cache holding at most ``max_size`` values, evicting the least recently used ones first.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def get(self, key, default=None):
+        if key not in self.values:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.values.move_to_end(key)
+        return self.values[key]
+
+    def put(self, key, value):
+        self.values[key] = value
+        self.values.move_to_end(key)
+        while len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self.values.pop(key, default)
@@ -6,6 +6,9 @@ from aiohttp import AsyncResolver, ClientSession, TCPConnector
 from discord import Game
 from discord.ext.commands import AutoShardedBot, when_mentioned_or
 
+from bot.constants import EXECUTOR_MAX_PENDING, EXECUTOR_WORKERS, HTTP_CONNECTION_LIMIT, \
+    HTTP_CONNECTION_LIMIT_PER_HOST, HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE_TIMEOUT
+from bot.executor import Executor
 from bot.formatter import Formatter
 from bot.utils import CaseInsensitiveDict
 
@@ -25,7 +28,21 @@ bot = AutoShardedBot(
 bot.cogs = CaseInsensitiveDict()
 
 # Global aiohttp session for all cogs - uses asyncio for DNS resolution instead of threads, so we don't *spam threads*
-bot.http_session = ClientSession(connector=TCPConnector(resolver=AsyncResolver()))
+# Connections are pooled and kept alive, so concurrent lookups to the same host reuse them instead of handshaking
+bot.http_session = ClientSession(connector=TCPConnector(
+    resolver=AsyncResolver(),
+    limit=HTTP_CONNECTION_LIMIT,
+    limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    conn_timeout=HTTP_CONNECT_TIMEOUT
+))
+
+# Global executor for blocking work (image rendering, model training...), so it doesn't stall the gateway
+bot.executor = Executor(
+    bot.loop,
+    workers=int(os.environ.get("EXECUTOR_WORKERS", EXECUTOR_WORKERS)),
+    max_pending=int(os.environ.get("EXECUTOR_MAX_PENDING", EXECUTOR_MAX_PENDING))
+)
 
 # Internal/debug
 bot.load_extension("bot.cogs.logging")
@@ -38,3 +55,4 @@ bot.load_extension("bot.cogs.snakes")
 bot.run(os.environ.get("BOT_TOKEN"))
 
 bot.http_session.close()  # Close the aiohttp session when the bot finishes running
+bot.executor.shutdown()
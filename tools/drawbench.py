@@ -0,0 +1,46 @@
+# a benchmark of snek drawing, separate images against a single sheet of sneks
+# the sheet is timed at its default size (what snakes.draw(n) sends) and with the same cell size as a separate
+# image, since encoding the PNG costs about the same per pixel either way
+# run from the project directory with:
+#     pipenv run python -m tools.drawbench [sneks]
+
+import math
+import sys
+import time
+
+from bot.sneks.drawing import IMAGE_SIZE, SHEET_SIZE, generate_snake_image, generate_snake_sheet
+
+
+def ms_per_snek(func, count):
+    start = time.perf_counter()
+    func(count)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def separate_images(count):
+    for seed in range(count):
+        generate_snake_image(seed)
+
+
+def default_sheet(count):
+    generate_snake_sheet(0, count, SHEET_SIZE)
+
+
+def same_pixels_sheet(count):
+    generate_snake_sheet(0, count, math.ceil(math.sqrt(count)) * IMAGE_SIZE)
+
+
+def main(counts):
+    # the same widths for the header and the rows, so they line up
+    header = '{0:>6} {1:>18} {2:>15} {3:>8} {4:>17} {5:>8}'
+    row = '{0:>6} {1:>18.2f} {2:>15.2f} {3:>7.1f}x {4:>17.2f} {5:>7.1f}x'
+    print(header.format('sneks', 'separate (ms/snek)', 'sheet (ms/snek)', 'speedup', 'same px (ms/snek)', 'speedup'))
+    for count in counts:
+        separate = ms_per_snek(separate_images, count)
+        sheet = ms_per_snek(default_sheet, count)
+        same_pixels = ms_per_snek(same_pixels_sheet, count)
+        print(row.format(count, separate, sheet, separate / sheet, same_pixels, separate / same_pixels))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [4, 16, 64])
@@ -0,0 +1,79 @@
+# a benchmark of the CPU time spent parsing ITIS search results: the old HTML search page (BeautifulSoup)
+# against the JSON web service (bot.sneks.itis)
+# needs network access and beautifulsoup4, run from the project directory with:
+#     pipenv run python -m tools.itisbench [iterations]
+
+import asyncio
+import sys
+import time
+
+import aiohttp
+
+from bs4 import BeautifulSoup
+
+from bot.sneks import itis
+
+ITIS_SEARCH_URL = "https://itis.gov/servlet/SingleRpt/SingleRpt"
+NAMES = ["python regius", "naja", "black mamba", "boa constrictor", "anacondas"]
+
+
+def parse_html_search(html):
+    # what scrape_itis used to do with the HTML search page
+    if "No Records Found?" in html:
+        return None
+    soup = BeautifulSoup(html, "html.parser")
+    tables = soup.find_all("table", {"width": "100%"})
+    for table in (tables[2], tables[1]):
+        if "No Records Found." not in str(table):
+            return table.find("a")['href']
+    return None
+
+
+def parse_json_search(scientific, common, name):
+    matches = itis.parse_scientific_search(scientific, name) + itis.parse_common_search(common, name)
+    return matches[0].tsn if len(matches) > 0 else None
+
+
+async def fetch_samples(session, name):
+    form_data = {
+        'categories': 'All',
+        'Go': 'Search',
+        'search_credRating': 'All',
+        'search_kingdom': 'Animal',
+        'search_span': 'exactly_for',
+        'search_topic': 'all',
+        'search_value': name,
+        'source': 'html'
+    }
+    async with session.post(ITIS_SEARCH_URL, data=form_data) as res:
+        html = await res.text(encoding='iso-8859-1')
+    async with session.get(itis.ITIS_JSON_SERVICE_SEARCH_SCIENTIFIC.format(name)) as res:
+        scientific = await res.text(encoding='iso-8859-1')
+    async with session.get(itis.ITIS_JSON_SERVICE_SEARCH_COMMON.format(name)) as res:
+        common = await res.text(encoding='iso-8859-1')
+    return name, html, scientific, common
+
+
+def cpu_time(func, args, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        func(*args)
+    return (time.process_time() - start) / iterations
+
+
+async def main(iterations):
+    async with aiohttp.ClientSession() as session:
+        samples = await asyncio.gather(*(fetch_samples(session, name) for name in NAMES))
+
+    print('{0:20} {1:>12} {2:>12} {3:>8}'.format('name', 'soup (ms)', 'json (ms)', 'speedup'))
+    for name, html, scientific, common in samples:
+        soup_time = cpu_time(parse_html_search, (html,), iterations)
+        json_time = cpu_time(parse_json_search, (scientific, common, name), iterations)
+        print('{0:20} {1:12.3f} {2:12.3f} {3:7.0f}x'.format(
+            name, soup_time * 1000, json_time * 1000, soup_time / json_time))
+
+
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
+    loop.close()
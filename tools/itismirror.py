@@ -0,0 +1,116 @@
+# a tool to build a local mirror of the ITIS snek database
+# download and unzip the SQLite dump from https://itis.gov/downloads/ first, then run:
+#     pipenv run python tools/itismirror.py path/to/ITIS.sqlite
+# the output file is read by the bot at startup (see bot/sneks/mirror.py)
+
+import os
+import sqlite3
+import sys
+
+OUTPUT_FILE = "itis.sqlite3"
+SERPENTES_TSN = 174118  # the suborder of all sneks
+
+SCHEMA = """
+CREATE TABLE taxa (
+    tsn INTEGER PRIMARY KEY,
+    scientific_name TEXT NOT NULL,
+    scientific_key TEXT NOT NULL,
+    rank TEXT NOT NULL,
+    parent_tsn INTEGER,
+    parent_name TEXT NOT NULL,
+    family TEXT NOT NULL
+);
+CREATE TABLE common_names (
+    tsn INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    language TEXT NOT NULL
+);
+CREATE TABLE geo (
+    tsn INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX taxa_scientific_key ON taxa (scientific_key);
+CREATE INDEX common_names_name_key ON common_names (name_key);
+CREATE INDEX common_names_tsn ON common_names (tsn);
+CREATE INDEX geo_tsn ON geo (tsn);
+"""
+
+# every valid taxon below (and including) Serpentes, with its rank name
+SUBTREE_QUERY = """
+WITH RECURSIVE subtree(tsn) AS (
+    SELECT ?
+    UNION
+    SELECT t.tsn FROM taxonomic_units t JOIN subtree s ON t.parent_tsn = s.tsn
+    WHERE t.name_usage IN ('valid', 'accepted')
+)
+SELECT t.tsn, t.complete_name, r.rank_name, t.parent_tsn
+FROM taxonomic_units t
+JOIN subtree s ON t.tsn = s.tsn
+JOIN taxon_unit_types r ON r.kingdom_id = t.kingdom_id AND r.rank_id = t.rank_id
+"""
+
+
+def normalize_name(name):
+    # same as bot.sneks.sneks.normalize_name, without importing the bot (and discord) here
+    return ' '.join(name.lower().split())
+
+
+def build_mirror(dump_path, output_path):
+    dump = sqlite3.connect("file:{0}?mode=ro".format(dump_path), uri=True)
+
+    taxa = {}
+    for tsn, name, rank, parent_tsn in dump.execute(SUBTREE_QUERY, (SERPENTES_TSN,)):
+        taxa[tsn] = (name.strip(), rank.strip(), parent_tsn)
+
+    def family_of(tsn):
+        # walk up the tree until a family is found
+        while tsn in taxa:
+            name, rank, parent_tsn = taxa[tsn]
+            if rank == 'Family':
+                return name
+            tsn = parent_tsn
+        return "Unknown"
+
+    def name_of(tsn):
+        return taxa[tsn][0] if tsn in taxa else ""
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    mirror = sqlite3.connect(output_path)
+    mirror.executescript(SCHEMA)
+
+    mirror.executemany(
+        "INSERT INTO taxa VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((tsn, name, normalize_name(name), rank, parent_tsn, name_of(parent_tsn), family_of(tsn))
+         for tsn, (name, rank, parent_tsn) in taxa.items())
+    )
+
+    # the dump tables are not indexed for these lookups, so scan them once and filter on our side
+    mirror.executemany(
+        "INSERT INTO common_names VALUES (?, ?, ?, ?)",
+        ((tsn, name.strip(), normalize_name(name), language)
+         for tsn, name, language in dump.execute("SELECT tsn, vernacular_name, language FROM vernaculars")
+         if tsn in taxa)
+    )
+    mirror.executemany(
+        "INSERT INTO geo VALUES (?, ?)",
+        ((tsn, value) for tsn, value in dump.execute("SELECT tsn, geographic_value FROM geographic_div")
+         if tsn in taxa)
+    )
+    mirror.commit()
+
+    common_names = mirror.execute("SELECT COUNT(*) FROM common_names").fetchone()[0]
+    mirror.execute("VACUUM")
+    mirror.close()
+    dump.close()
+    return len(taxa), common_names
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: itismirror.py <path to ITIS.sqlite> [output file]')
+        sys.exit(1)
+    output = sys.argv[2] if len(sys.argv) > 2 else OUTPUT_FILE
+    taxa_count, names_count = build_mirror(sys.argv[1], output)
+    print('done output of {0} taxa and {1} common names to {2}'.format(taxa_count, names_count, output))
@@ -0,0 +1,38 @@
+# a microbenchmark of Perlin noise, one point at a time against the batch API
+# run from the project directory with:
+#     pipenv run python -m tools.perlinbench [points]
+
+import functools
+import sys
+import time
+
+import numpy as np
+
+from bot.sneks.perlin import PerlinNoiseFactory
+
+OCTAVES = 2
+
+
+def scalar_noise(factory, points):
+    return [factory(*point) for point in points.tolist()]
+
+
+def points_per_second(func, points):
+    start = time.perf_counter()
+    func(points)
+    return len(points) / (time.perf_counter() - start)
+
+
+def main(count):
+    print('{0:>4} {1:>16} {2:>16} {3:>8}'.format('dim', 'scalar (pts/s)', 'batch (pts/s)', 'speedup'))
+    for dimension in (1, 2, 3):
+        points = np.random.uniform(0, 16, (count, dimension))
+        factory = PerlinNoiseFactory(dimension, octaves=OCTAVES, seed=dimension)
+
+        scalar = points_per_second(functools.partial(scalar_noise, factory), points)
+        batch = points_per_second(factory.noise, points)
+        print('{0:>4} {1:16,.0f} {2:16,.0f} {3:7.1f}x'.format(dimension, scalar, batch, batch / scalar))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,63 @@
+# a benchmark of Snakes and Ladders board rendering, many games at once
+# compares decoding the board and pasting every player each round (how boards used to be drawn) against
+# the shared base board and incremental canvas of bot.sneks.salboard
+# run from the project directory with:
+#     pipenv run python -m tools.salbench [games] [rounds]
+
+import io
+import random
+import sys
+import time
+
+from PIL import Image
+
+from res.ladders.board import BOARD, BOARD_PLAYER_SIZE, MAX_PLAYERS
+
+from bot.sneks.salboard import BOARD_FILE, BoardCanvas, player_box
+
+
+def full_render(placements):
+    board_img = Image.open(BOARD_FILE)
+    for slot, (_, avatar, tile) in enumerate(placements):
+        board_img.paste(avatar, box=player_box(slot, tile)[:2])
+    stream = io.BytesIO()
+    board_img.save(stream, format='JPEG')
+    return stream.getvalue()
+
+
+def play(games, rounds, seed=0):
+    # the placements of every game, round after round
+    rng = random.Random(seed)
+    avatars = [Image.new('RGB', (BOARD_PLAYER_SIZE, BOARD_PLAYER_SIZE), color=rng.randrange(0xffffff))
+               for _ in range(MAX_PLAYERS)]
+    tiles = [[1] * MAX_PLAYERS for _ in range(games)]
+    history = []
+    for _ in range(rounds):
+        history.append([[(player, avatars[player], tile) for player, tile in enumerate(game)] for game in tiles])
+        for game in tiles:
+            for player, tile in enumerate(game):
+                tile = min(100, tile + rng.randint(1, 6))
+                game[player] = BOARD.get(tile, tile)
+    return history
+
+
+def rounds_per_second(history, make_renderer):
+    renderers = [make_renderer() for _ in history[0]]
+    start = time.perf_counter()
+    for round_placements in history:
+        for render, placements in zip(renderers, round_placements):
+            render(placements)
+    return len(history) * len(renderers) / (time.perf_counter() - start)
+
+
+def main(games, rounds):
+    history = play(games, rounds)
+    full = rounds_per_second(history, lambda: full_render)
+    incremental = rounds_per_second(history, lambda: BoardCanvas().render)
+    print('{0} games, {1} rounds each, {2} players per game'.format(games, rounds, MAX_PLAYERS))
+    print('full redraw: {0:8.1f} rounds/s'.format(full))
+    print('incremental: {0:8.1f} rounds/s ({1:.1f}x)'.format(incremental, incremental / full))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -1,30 +1,109 @@
 # a tool to fetch some sneks
-# should be run in the same pipenv as the bot (using pipenv shell)
+# should be run in the same pipenv as the bot, from the project directory:
+#     pipenv run python -m tools.snekfetcher
+# by default, only the sneks added to the categories since the last run are fetched; use --full to start over
 
+import argparse
 import asyncio
-import pickle
+import os
+import time
 
 import aiohttp
 
-OUTPUT_FILE = "sneks.pickle"
-FETCH_URL = "https://en.wikipedia.org/w/api.php?action=query&list=categorymembers" \
-            "&cmtitle=Category:Snake_genera&cmlimit=500&cmtype=page&format=json"
+from bot.sneks.namefile import NameFile, write_name_file
 
+OUTPUT_FILE = "sneks.names"
+CATEGORIES = ["Category:Snake genera", "Category:Snakes by family"]
+API_URL = "https://en.wikipedia.org/w/api.php"
+MAX_DEPTH = 3  # how deep to go into subcategories
+MAX_CONCURRENCY = 4  # requests to Wikipedia at the same time
 
-async def fetch(session):
-    async with session.get(FETCH_URL) as res:
-        return await res.json()
 
+class Crawler:
+    def __init__(self, session, concurrency, since=None):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.since = since
+        self.seen_categories = set()
+        self.names = set()
+        self.requests = 0
 
-loop = asyncio.get_event_loop()
+    async def members(self, category, member_type, since=None):
+        # lists all the members of a category, following the continuation tokens
+        params = {
+            'action': 'query',
+            'list': 'categorymembers',
+            'cmtitle': category,
+            'cmtype': member_type,
+            'cmlimit': 'max',
+            'format': 'json'
+        }
+        if since is not None:
+            # only the members added since then
+            params.update({
+                'cmsort': 'timestamp',
+                'cmdir': 'asc',
+                'cmstart': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(since))
+            })
+        titles = []
+        while True:
+            async with self.semaphore:
+                self.requests += 1
+                async with self.session.get(API_URL, params=params) as res:
+                    result = await res.json()
+            titles.extend(member['title'] for member in result['query']['categorymembers'])
+            if 'continue' not in result:
+                return titles
+            params.update(result['continue'])
 
-with aiohttp.ClientSession(loop=loop) as session:
-    result = loop.run_until_complete(
-        fetch(session)
-    )
-    snake_names = [r['title'] for r in result['query']['categorymembers']]
-    with open(OUTPUT_FILE, 'wb') as out:
-        pickle.dump(snake_names, out)
-        print('done output of ' + str(len(snake_names)) + ' sneks')
+    async def crawl(self, category, depth):
+        if category in self.seen_categories:
+            return
+        self.seen_categories.add(category)
+        # subcategories are always listed in full, since a new snek can be added to an old subcategory
+        pages, subcategories = await asyncio.gather(
+            self.members(category, 'page', since=self.since),
+            self.members(category, 'subcat') if depth > 0 else asyncio.sleep(0, result=[])
+        )
+        self.names.update(title for title in pages if not title.startswith("List of"))
+        await asyncio.gather(*(self.crawl(subcategory, depth - 1) for subcategory in subcategories))
 
-loop.close()
+
+async def fetch(categories, depth, concurrency, since):
+    async with aiohttp.ClientSession() as session:
+        crawler = Crawler(session, concurrency, since=since)
+        await asyncio.gather(*(crawler.crawl(category, depth) for category in categories))
+        return crawler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetches snek names from Wikipedia categories.")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="the name file to write")
+    parser.add_argument('--category', action='append', dest='categories',
+                        help="a category to crawl (can be repeated, defaults to snake genera and families)")
+    parser.add_argument('--depth', type=int, default=MAX_DEPTH, help="how deep to crawl into subcategories")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY, help="max simultaneous requests")
+    parser.add_argument('--full', action='store_true', help="ignore the existing file and fetch everything")
+    args = parser.parse_args()
+
+    existing = []
+    since = None
+    if not args.full and os.path.isfile(args.output):
+        name_file = NameFile(args.output)
+        existing = list(name_file)
+        since = name_file.crawled_at
+        name_file.close()
+
+    started_at = time.time()
+    loop = asyncio.get_event_loop()
+    crawler = loop.run_until_complete(fetch(args.categories or CATEGORIES, args.depth, args.concurrency, since))
+    loop.close()
+
+    names = crawler.names.union(existing)
+    write_name_file(args.output, names, started_at)
+    print('done output of {0} sneks ({1} new) from {2} categories in {3} requests'.format(
+        len(names), len(names) - len(existing), len(crawler.seen_categories), crawler.requests))
+
+
+if __name__ == '__main__':
+    main()